@@ -1,20 +1,76 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, font as tkfont
 import json
 import os
-from PIL import Image, ImageDraw
+import re
+import csv
+import threading
+import time
 import source_configuration as sc
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-
-# Placeholder function for the image generation
-def get_placeholder_image():
-    image = Image.new('RGB', (600, 600), 'black')
-    draw = ImageDraw.Draw(image)
-    draw.text((150, 300), "Utopian Automated Laboratory", fill="white")
-    image.save("placeholder_image.png")
-    return "placeholder_image.png"
+import recipe_library
+import recipe_runner
+import run_queue
+import workflow_store
+import workflow_catalogue
+import workflow_history
+import workflow_schema
+import workflow_events
+import stage_gating
+import run_index
+import lazy_imports
+from gui_common import pd, get_placeholder_image
+
+# Modules only needed by some windows are imported on first use (or warmed up once the entry window is shown)
+recipe_validation = lazy_imports.lazy("recipe_validation")
+recipe_simulation = lazy_imports.lazy("recipe_simulation")
+composition_store = lazy_imports.lazy("composition_store")
+composition_space = lazy_imports.lazy("composition_space")
+power_solver = lazy_imports.lazy("power_solver")
+learning_data = lazy_imports.lazy("learning_data")
+wc = lazy_imports.lazy("workflow_control", warm=False)  # Controller interface, only loaded when a recipe is parsed or run
+
+# Parsed recipes shared by the recipe preview, validation and runs
+recipe_cache = recipe_library.RecipeCache(lambda path: wc.get_recipe_from_file(path))
+
+# Upper limit of the "iterations" entry. The specification names the limit (max_iterations) but
+# leaves its value to the lab: set "max_iterations" in config.json, otherwise this default is used.
+DEFAULT_MAX_ITERATIONS = 100
+
+# Most candidate compositions the Generate popup builds at once (before constraints), so a fine
+# lattice cannot freeze the window; composition_space.generate() itself has no limit
+MAX_GENERATED_CANDIDATES = 200000
+
+# Reports (and learning data) written by the self-driving lab, one folder per run
+SDL_REPORTS_DIR = "C:/Users/jonsc690/Documents/BEA-supervisor/SDL_reports"
+SDL_RUNS = run_index.shared(SDL_REPORTS_DIR)  # Parsed report folders, persisted between sessions
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+class WindowManager:
+    # Keeps one instance of each child window alive; closing a window only hides it
+    def __init__(self, root):
+        self.root = root
+        self.windows = {}
+
+    def show(self, window_class):
+        self.root.withdraw()
+        window = self.windows.get(window_class)
+        if window is not None and window.winfo_exists():
+            window.refresh()
+            window.deiconify()
+            window.lift()
+        else:
+            window = window_class(self.root)
+            self.windows[window_class] = window
+        return window
+
+    def hide(self, window):
+        window.withdraw()
+        self.root.deiconify()
 
 class BerthaGUI(tk.Tk):
     def __init__(self):
@@ -26,9 +82,11 @@ class BerthaGUI(tk.Tk):
         self.protocol("WM_DELETE_WINDOW", self.on_closing)  # Handle window close
         self.config_file = "config.json"
         self.load_config()
+        self.window_manager = WindowManager(self)
 
         self.create_widgets()
         self.apply_dark_theme()
+        self.after(100, lazy_imports.warm_up)  # Load pandas once the first frame is up
 
     def create_widgets(self):
         self.placeholder_image = tk.PhotoImage(file=get_placeholder_image())
@@ -66,18 +124,34 @@ class BerthaGUI(tk.Tk):
             json.dump(self.config_data, file)
 
     def enter_workflow(self):
-        self.withdraw()
-        WorkflowWindow(self)
+        self.window_manager.show(WorkflowWindow)
 
     def run_standard_recipe(self):
-        self.withdraw()
-        RecipeWindow(self)
+        self.window_manager.show(RecipeWindow)
 
     def system_setup(self):
-        self.withdraw()
-        SetupWindow(self)
+        self.window_manager.show(SetupWindow)
 
     def on_closing(self):
+        recipe_window = self.window_manager.windows.get(RecipeWindow)
+        if recipe_window is not None and recipe_window.runner.running:
+            if recipe_window.runner.control.interruptible:
+                if not messagebox.askyesno("Recipe Running", "A recipe is still running. Cancel it and exit?"):
+                    return
+                recipe_window.runner.cancel()
+            elif not messagebox.askyesno("Recipe Running", "A recipe is running on the controller and cannot be stopped. Close the window? The program exits once the run has finished."):
+                return
+        workflow_window = self.window_manager.windows.get(WorkflowWindow)
+        if workflow_window is not None and workflow_window.workflow_store is not None:
+            try:
+                workflow_window.flush_workflow()  # Wait for pending workflow writes
+            except workflow_store.WorkflowWriteError as e:
+                if not messagebox.askyesno("Save Failed", f"{e}\n\nExit anyway? Workflow changes not written yet are lost."):
+                    return
+            try:
+                workflow_window.workflow_store.close()
+            except workflow_store.WorkflowWriteError as e:
+                print(e)  # Already reported above
         self.destroy()
         self.quit()
 
@@ -87,6 +161,7 @@ class SetupWindow(tk.Toplevel):
         self.parent = parent
         self.title("System Setup")
         self.geometry("800x600")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
         self.create_widgets()
 
@@ -125,12 +200,21 @@ class SetupWindow(tk.Toplevel):
             for entry in entry_list:
                 entry.configure(state='normal')
 
+    def refresh(self):
+        # Show the current source configuration again, read-only, when the window is reopened
+        for list_name, entry_list in self.entries.items():
+            for entry, value in zip(entry_list, getattr(sc, list_name)):
+                entry.configure(state='normal')
+                if entry.get() != str(value):
+                    entry.delete(0, tk.END)
+                    entry.insert(0, str(value))
+                entry.configure(state='readonly')
+
     def on_close(self):
         if any(entry.get() != str(getattr(sc, list_name)[col-1]) for list_name, entry_list in self.entries.items() for col, entry in enumerate(entry_list, 1)):
             if messagebox.askyesno("Confirm", "Save changes?"):
                 self.update_source_config()
-        self.parent.deiconify()
-        self.destroy()
+        self.parent.window_manager.hide(self)
 
     def update_source_config(self):
         for list_name, entry_list in self.entries.items():
@@ -144,14 +228,149 @@ class SetupWindow(tk.Toplevel):
             for name, values in sc_dict.items():
                 f.write(f"{name} = {values}\n")
 
+def scroll_position(args, current, total, page):
+    # New first row or column for a scrollbar command ("moveto", fraction) or ("scroll", n, "units"/"pages")
+    if args[0] == "moveto":
+        position = int(float(args[1]) * total)
+    else:
+        step = page if args[2] == "pages" else 1
+        position = current + int(args[1]) * step
+    return max(0, min(position, max(total - page, 0)))
+
+class RecipePreview(ttk.Frame):
+    # Table view of a tab-separated recipe that only draws the rows and columns in view.
+    # The file is indexed a chunk at a time from the Tk loop, so any length of recipe opens at once.
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.font = tkfont.nametofont("TkFixedFont")
+        self.row_height = self.font.metrics("linespace") + 4
+
+        self.canvas = tk.Canvas(self, background="white", highlightthickness=0)
+        self.scroll_y = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scroll_x = ttk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.xview)
+        self.scroll_x.pack(side=tk.BOTTOM, fill=tk.X)
+        self.scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
+
+        self.canvas.bind("<Configure>", lambda event: self.redraw())
+        self.canvas.bind("<Enter>", lambda event: self.canvas.focus_set())
+        self.canvas.bind("<MouseWheel>", self.on_mousewheel)
+        self.canvas.bind("<Button-4>", lambda event: self.yview("scroll", -3, "units"))
+        self.canvas.bind("<Button-5>", lambda event: self.yview("scroll", 3, "units"))
+
+        self.line_index = None
+        self.headers = []
+        self.column_widths = []
+        self.top_row = 0
+        self.left_column = 0
+        self.index_job = None
+
+    def load(self, path):
+        self.clear()
+        self.line_index = recipe_library.LineIndex(path)
+        # Index enough of the file for the header and a sample of rows to size the columns
+        while self.line_index.line_count < 201 and not self.line_index.build_step():
+            pass
+        header = self.line_index.read_lines(0, 1)
+        self.headers = header[0].split("\t") if header else []
+        sample = [line.split("\t") for line in self.line_index.read_lines(1, 200)]
+        self.column_widths = [max([self.font.measure(name)] + [self.font.measure(row[i]) for row in sample if i < len(row)]) + 12
+                              for i, name in enumerate(self.headers)]
+        self.redraw()
+        if not self.line_index.done:
+            self.index_job = self.after(1, self.continue_indexing)
+
+    def continue_indexing(self):
+        self.index_job = None
+        if self.line_index is None:
+            return
+        if not self.line_index.build_step():
+            self.index_job = self.after(1, self.continue_indexing)
+        self.redraw()
+
+    def clear(self):
+        if self.index_job:
+            self.after_cancel(self.index_job)
+            self.index_job = None
+        if self.line_index:
+            self.line_index.close()
+        self.line_index = None
+        self.headers = []
+        self.column_widths = []
+        self.top_row = 0
+        self.left_column = 0
+        self.redraw()
+
+    @property
+    def row_count(self):
+        return max(self.line_index.line_count - 1, 0) if self.line_index else 0
+
+    def visible_rows(self):
+        return max(self.canvas.winfo_height() // self.row_height - 1, 1)  # One row is taken by the header
+
+    def visible_columns(self):
+        width, count = 0, 0
+        for column_width in self.column_widths[self.left_column:]:
+            count += 1
+            width += column_width
+            if width >= self.canvas.winfo_width():
+                break
+        return max(count, 1)
+
+    def redraw(self):
+        self.canvas.delete("all")
+        n_rows = self.visible_rows()
+        n_columns = self.visible_columns()
+        self.top_row = max(0, min(self.top_row, self.row_count - n_rows))
+        rows = [line.split("\t") for line in self.line_index.read_lines(self.top_row + 1, n_rows)] if self.line_index else []
+
+        x = 0
+        for column in range(self.left_column, min(self.left_column + n_columns, len(self.headers))):
+            width = self.column_widths[column]
+            self.canvas.create_rectangle(x, 0, x + width, self.row_height, fill="gray85", outline="gray70")
+            self.canvas.create_text(x + 6, self.row_height // 2, text=self.headers[column], anchor=tk.W, font=self.font)
+            for row, values in enumerate(rows, 1):
+                if column < len(values):
+                    self.canvas.create_text(x + 6, row * self.row_height + self.row_height // 2, text=values[column], anchor=tk.W, font=self.font)
+            x += width
+
+        rows_total, columns_total = self.row_count, len(self.headers)
+        self.scroll_y.set(*((self.top_row / rows_total, min((self.top_row + n_rows) / rows_total, 1.0)) if rows_total else (0, 1)))
+        self.scroll_x.set(*((self.left_column / columns_total, min((self.left_column + n_columns) / columns_total, 1.0)) if columns_total else (0, 1)))
+
+    def yview(self, *args):
+        self.top_row = scroll_position(args, self.top_row, self.row_count, self.visible_rows())
+        self.redraw()
+
+    def xview(self, *args):
+        self.left_column = scroll_position(args, self.left_column, len(self.headers), 1)
+        self.redraw()
+
+    def on_mousewheel(self, event):
+        self.yview("scroll", -3 if event.delta > 0 else 3, "units")
+
 class RecipeWindow(tk.Toplevel):
     def __init__(self, parent):
         super().__init__(parent)
         self.parent = parent
         self.title("Run Standard Recipe")
         self.geometry("800x800")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
         self.recipe_dir = r"C:\Users\jonsc690\Documents\BEA-supervisor\Recipes"
+        self.max_iterations = int(parent.config_data.get("max_iterations", DEFAULT_MAX_ITERATIONS))
+        self.recipe_library = recipe_library.RecipeLibrary(self.recipe_dir, materials=sc.materials)
+        self.recipe_refresh_thread = None
+        self.recipe_path = None  # Filepath of the selected recipe
+        self.recipe = None
+        self.active_sources = None
+        self.last_simulation = None
+        self.controller_started = None  # time.monotonic() when the current series reached the controller
+        self.controller_expected = None  # Its expected duration in seconds, if known
+        self.poll_job = None  # after() id of the scheduled poll_run_events, so only one loop runs
+        self.runner = recipe_runner.RecipeRunner()  # Runs keep going while the window is hidden
+        self.run_queue = run_queue.RunQueue()
+        self.scheduler = run_queue.RunScheduler(self.run_queue, self.runner, lambda job: self.prepare_run(job["recipe_path"], job["settings"], interactive=False))
         self.create_widgets()
 
     def create_widgets(self):
@@ -167,6 +386,17 @@ class RecipeWindow(tk.Toplevel):
 
         self.recipe_combobox = ttk.Combobox(self.process_frame)
         self.recipe_combobox.pack(pady=5)
+
+        # Only list recipes that use all of the ticked sources
+        self.recipe_filter_frame = ttk.LabelFrame(self.process_frame, text="Filter by Sources")
+        self.recipe_filter_frame.pack(pady=5, fill=tk.X)
+        self.recipe_filter_vars = []
+        for i, material in enumerate(sc.materials):
+            filter_var = tk.IntVar(value=0)
+            filter_check = ttk.Checkbutton(self.recipe_filter_frame, text=material, variable=filter_var, command=self.update_recipe_list)
+            filter_check.grid(row=i // 3, column=i % 3, sticky=tk.W, padx=2)
+            self.recipe_filter_vars.append(filter_var)
+
         self.load_recipes()
 
         self.presputter_label = ttk.Label(self.process_frame, text="Presputter Time (s)")
@@ -196,12 +426,36 @@ class RecipeWindow(tk.Toplevel):
         self.make_samples_check = ttk.Checkbutton(self.process_frame, text="Make Samples", variable=self.make_samples_check_var)
         self.make_samples_check.pack(pady=5)
 
+        self.run_status_frame = ttk.LabelFrame(self.process_frame, text="Run Status")
+        self.run_status_frame.pack(pady=5, fill=tk.X)
+
+        self.run_progress = ttk.Progressbar(self.run_status_frame, maximum=100)
+        self.run_progress.pack(fill=tk.X, padx=5, pady=5)
+
+        self.run_status_var = tk.StringVar(value="Idle")
+        self.run_status_label = ttk.Label(self.run_status_frame, textvariable=self.run_status_var, wraplength=180)
+        self.run_status_label.pack(padx=5, pady=5)
+
         # Recipe preview widgets
         self.recipe_preview_label = ttk.Label(self.recipe_preview_frame, text="Recipe Preview")
         self.recipe_preview_label.pack(pady=5)
 
-        self.recipe_preview_text = tk.Text(self.recipe_preview_frame)
-        self.recipe_preview_text.pack(expand=True, fill=tk.BOTH, pady=5)
+        self.recipe_preview = RecipePreview(self.recipe_preview_frame)
+        self.recipe_preview.pack(expand=True, fill=tk.BOTH, pady=5)
+
+        # Recipes queued for unattended runs; the queue is saved in the user cache after every change
+        self.queue_frame = ttk.LabelFrame(self.recipe_preview_frame, text="Run Queue")
+        self.queue_frame.pack(fill=tk.X, pady=5)
+
+        self.queue_listbox = tk.Listbox(self.queue_frame, height=6)
+        self.queue_listbox.pack(fill=tk.X, padx=5, pady=5)
+
+        self.queue_buttons_frame = ttk.Frame(self.queue_frame)
+        self.queue_buttons_frame.pack(fill=tk.X)
+        for text, command in (("Start Queue", self.start_queue), ("Stop Queue", self.stop_queue),
+                              ("Retry", self.retry_queue_job), ("Remove", self.remove_queue_job)):
+            ttk.Button(self.queue_buttons_frame, text=text, command=command).pack(side=tk.LEFT, padx=5, pady=5)
+        self.update_queue_list()
 
         self.sim_save_frame = ttk.Frame(self)
         self.sim_save_frame.pack(side=tk.LEFT, fill=tk.X, padx=10, pady=10)
@@ -220,30 +474,480 @@ class RecipeWindow(tk.Toplevel):
         self.run_button = ttk.Button(self.run_cancel_frame, text="Run Recipe", command=self.run_recipe)
         self.run_button.pack(side=tk.LEFT, padx=5, pady=5)
 
+        self.queue_button = ttk.Button(self.run_cancel_frame, text="Add to Queue", command=self.add_to_queue)
+        self.queue_button.pack(side=tk.LEFT, padx=5, pady=5)
+
+        self.pause_button = ttk.Button(self.run_cancel_frame, text="Pause", command=self.toggle_pause, state=tk.DISABLED)
+        self.pause_button.pack(side=tk.LEFT, padx=5, pady=5)
+
+        self.stop_button = ttk.Button(self.run_cancel_frame, text="Stop", command=self.stop_run, state=tk.DISABLED)
+        self.stop_button.pack(side=tk.LEFT, padx=5, pady=5)
+
         self.cancel_button = ttk.Button(self.run_cancel_frame, text="Cancel", command=self.on_close)
         self.cancel_button.pack(side=tk.LEFT, padx=5, pady=5)
 
     def load_recipes(self):
-        recipe_files = [f for f in os.listdir(self.recipe_dir) if f.endswith('.txt')]
-        self.recipe_combobox['values'] = recipe_files
+        # Show the persisted index straight away, then bring it up to date in the background
+        self.update_recipe_list()
         self.recipe_combobox.bind('<<ComboboxSelected>>', self.display_recipe)
+        if self.recipe_refresh_thread is None or not self.recipe_refresh_thread.is_alive():
+            self.recipe_refresh_thread = threading.Thread(target=self.recipe_library.refresh, daemon=True)
+            self.recipe_refresh_thread.start()
+            self.after(100, self.check_recipe_refresh)
+
+    def check_recipe_refresh(self):
+        if self.recipe_refresh_thread.is_alive():
+            self.after(100, self.check_recipe_refresh)
+        else:
+            self.update_recipe_list()
+
+    def update_recipe_list(self):
+        required_sources = [var.get() == 1 for var in self.recipe_filter_vars]
+        self.recipe_combobox['values'] = self.recipe_library.names(required_sources)
 
     def display_recipe(self, event):
         selected_recipe = self.recipe_combobox.get()
         recipe_path = os.path.join(self.recipe_dir, selected_recipe)
         if os.path.isfile(recipe_path):
-            with open(recipe_path, 'r') as file:
-                recipe_content = file.read()
-            self.recipe_preview_text.delete('1.0', tk.END)
-            self.recipe_preview_text.insert(tk.END, recipe_content)
+            self.recipe_preview.load(recipe_path)
+            self.recipe_path = recipe_path
+            self.load_selected_recipe()
+
+    def load_selected_recipe(self):
+        # Parsed recipe for the current selection; repeated selections and runs hit the cache
+        try:
+            self.recipe, self.active_sources = recipe_cache.get(self.recipe_path)
+        except Exception as e:
+            self.recipe, self.active_sources = None, None
+            messagebox.showerror("Error", f"Error reading recipe file: {e}")
+            return False
+        return True
 
     def run_recipe(self):
-        # Logic to run the recipe
-        pass
+        if self.runner.running:
+            messagebox.showwarning("Warning", "A recipe is already running.")
+            return
+        if not self.recipe_path:
+            messagebox.showwarning("Warning", "Please select a recipe.")
+            return
+        try:
+            job, args = self.prepare_run(self.recipe_path, self.run_settings())
+        except Exception as e:
+            messagebox.showerror("Recipe Validation", str(e))
+            return
+        self.runner.start(job, *args)
+        self.set_run_controls(True)
+        self.watch_run_events()
+
+    def prepare_run(self, recipe_path, settings, interactive=True):
+        # Parse (cached) and validate a recipe; raises with the validation summary if it cannot run.
+        # What could not be checked is shown as a warning (interactive only) and does not stop the run.
+        recipe, active_sources = recipe_cache.get(recipe_path)
+        report = recipe_validation.validate_recipe(recipe, active_sources, sc.max_powers, sc.materials,
+                                                   settings["presputter_time"], settings["iterations"], self.max_iterations)
+        if not report.ok:
+            raise ValueError(report.summary())
+        if report.warnings and interactive:
+            messagebox.showwarning("Recipe Validation", "\n".join(report.warnings))
+        if settings["simulate"]:
+            # Predicted locally, no controller needed
+            return recipe_simulation.simulation_job, (recipe, active_sources, sc.materials, settings)
+        return recipe_runner.run_series, (wc.initialise_series, active_sources, recipe, settings, self.expected_run_time(recipe, active_sources, settings))
+
+    def expected_run_time(self, recipe, active_sources, settings):
+        # Seconds the controller should take, from the simulator's timing; None when it cannot tell
+        try:
+            return recipe_simulation.simulate_recipe(recipe, active_sources, sc.materials, settings["presputter_time"], settings["iterations"],
+                                                     settings["use_qcms"], settings["min_qcm"]).run_time
+        except (ValueError, TypeError):
+            return None
+
+    def parse_int(self, value):
+        # Entries that are not whole numbers are passed through and reported by validation
+        try:
+            return int(value)
+        except ValueError:
+            return value
+
+    def run_settings(self):
+        return {
+            "presputter_time": self.parse_int(self.presputter_entry.get()),
+            "use_qcms": bool(self.use_qcms_toggle_var.get()),
+            "min_qcm": bool(self.min_qcm_toggle_var.get()),
+            "iterations": self.parse_int(self.iterations_entry.get()),
+            "make_samples": bool(self.make_samples_check_var.get()),
+            "simulate": bool(self.simulate_toggle_var.get()),
+            "save": bool(self.save_toggle_var.get()),
+        }
+
+    def watch_run_events(self):
+        # Start polling the runner unless a poll is already scheduled
+        if self.poll_job is None:
+            self.poll_run_events()
+
+    def poll_run_events(self):
+        # Drain the worker's events on the Tk thread so the window keeps repainting during long runs
+        self.poll_job = None
+        for kind, value, message in self.runner.drain():
+            if kind == "progress":
+                self.stop_controller_activity()
+                self.run_progress['value'] = value * 100
+            elif kind == "handed_over":
+                self.controller_started = time.monotonic()
+                self.controller_expected = value
+                if not value:
+                    self.run_progress.config(mode="indeterminate")
+                    self.run_progress.start(50)
+            elif kind == "error" and self.scheduler.current is None:
+                messagebox.showerror("Error", f"Recipe run failed: {message}")
+            elif kind == "done" and isinstance(value, recipe_simulation.SimulationResult):
+                self.last_simulation = value
+                if self.scheduler.current is None:
+                    messagebox.showinfo("Simulation", value.summary())
+            self.run_status_var.set(message)
+            if kind in ("done", "cancelled", "error"):
+                self.stop_controller_activity()
+                if self.scheduler.current is not None:
+                    self.scheduler.on_finished(kind, message)  # Starts the next queued recipe, if any
+                    self.update_queue_list()
+                    self.set_run_controls(self.runner.running)
+        if self.controller_started is not None and self.runner.running:
+            self.show_controller_activity()
+        if self.runner.running or self.runner.has_pending_events():
+            self.poll_job = self.after(100, self.poll_run_events)
+        else:
+            self.set_run_controls(False)
+
+    def show_controller_activity(self):
+        # The controller reports nothing until the series returns: show elapsed against expected time
+        elapsed = time.monotonic() - self.controller_started
+        text = f"Running on the controller: {format_duration(elapsed)}"
+        if self.controller_expected:
+            self.run_progress['value'] = min(elapsed / self.controller_expected, 0.99) * 100
+            text += f" of about {format_duration(self.controller_expected)}"
+        self.run_status_var.set(text)
+
+    def stop_controller_activity(self):
+        if self.controller_started is not None:
+            self.controller_started = None
+            self.run_progress.stop()
+            self.run_progress.config(mode="determinate")
+
+    def set_run_controls(self, running):
+        # A series on the controller cannot be paused or stopped, only simulations can
+        interruptible = running and self.runner.job is not recipe_runner.run_series
+        self.run_button.config(state=tk.DISABLED if running else tk.NORMAL)
+        self.pause_button.config(state=tk.NORMAL if interruptible else tk.DISABLED, text="Pause")
+        self.stop_button.config(state=tk.NORMAL if interruptible else tk.DISABLED)
+
+    def toggle_pause(self):
+        if self.runner.control.paused:
+            self.runner.resume()
+            self.pause_button.config(text="Pause")
+        else:
+            self.runner.pause()
+            self.pause_button.config(text="Resume")
+
+    def stop_run(self):
+        if messagebox.askyesno("Stop Run", "Cancel this simulation?"):
+            self.runner.cancel()
+
+    def add_to_queue(self):
+        if not self.recipe_path:
+            messagebox.showwarning("Warning", "Please select a recipe.")
+            return
+        settings = self.run_settings()
+        try:
+            self.prepare_run(self.recipe_path, settings)  # Reject recipes that would fail later tonight
+        except Exception as e:
+            messagebox.showerror("Recipe Validation", str(e))
+            return
+        self.run_queue.add(self.recipe_path, settings)
+        self.update_queue_list()
+
+    def start_queue(self):
+        if self.runner.running and self.scheduler.current is None:
+            messagebox.showwarning("Warning", "A recipe is already running.")
+            return
+        if self.scheduler.start():
+            self.set_run_controls(True)
+            self.watch_run_events()
+        self.update_queue_list()
+
+    def stop_queue(self):
+        self.scheduler.stop()
+        self.run_status_var.set("Queue stops after the current recipe")
+
+    def selected_queue_job(self):
+        selection = self.queue_listbox.curselection()
+        return self.run_queue.jobs[selection[0]] if selection else None
+
+    def retry_queue_job(self):
+        job = self.selected_queue_job()
+        if job:
+            self.run_queue.retry(job["id"])
+            self.update_queue_list()
+
+    def remove_queue_job(self):
+        job = self.selected_queue_job()
+        if job:
+            self.run_queue.remove(job["id"])
+            self.update_queue_list()
+
+    def update_queue_list(self):
+        self.queue_listbox.delete(0, tk.END)
+        for job in self.run_queue.jobs:
+            self.queue_listbox.insert(tk.END, self.run_queue.describe(job))
+
+    def refresh(self):
+        # Pick up recipes added to the folder while the window was hidden
+        self.load_recipes()
 
     def on_close(self):
-        self.parent.deiconify()
-        self.destroy()
+        self.parent.window_manager.hide(self)
+
+class CompositionGrid(ttk.Frame):
+    # Target composition table with any number of rows. Values live in self.data (one list of
+    # strings per row, in column order) and only the rows that fit in the window are real
+    # widgets; scrolling rebinds that pool of widgets to other rows. set_columns() keeps the
+    # pool and only creates or destroys the column difference.
+    def __init__(self, parent, on_bind, validate, rows=8):
+        super().__init__(parent)
+        self.on_bind = on_bind
+        self.validate = validate  # validate(text) -> bool for a single cell
+        self.min_rows = rows
+        self.columns = []
+        self.data = []
+        self.bound = []
+        self.top_row = 0
+        self.rendering = False
+
+        self.table = ttk.Frame(self)
+        self.scroll_y = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
+        self.table.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
+        self.table.grid_propagate(False)  # The pool follows the frame's size, not the other way round
+        self.table.bind("<Configure>", lambda event: self.fit_pool())
+        self.bind_scrolling(self.table)
+
+        self.validate_command = (self.register(self.on_validate), '%P', '%W')
+        self.header_labels = []
+        self.bind_header = ttk.Label(self.table, text="Bind Target")  # Shown once there are columns
+        self.pool = []  # Per visible row: {"label": Label, "entries": [Entry], "button": Button}
+        self.cells = {}  # Entry path name -> (pool row, column)
+        self.set_row_count(rows)
+        self.set_pool_size(8)
+
+    def bind_scrolling(self, widget):
+        widget.bind("<MouseWheel>", lambda event: self.yview("scroll", -3 if event.delta > 0 else 3, "units"))
+        widget.bind("<Button-4>", lambda event: self.yview("scroll", -3, "units"))
+        widget.bind("<Button-5>", lambda event: self.yview("scroll", 3, "units"))
+
+    @property
+    def row_count(self):
+        return len(self.data)
+
+    def set_columns(self, columns):
+        columns = list(columns)
+        if columns == self.columns:
+            return
+        while len(self.header_labels) < len(columns):
+            label = ttk.Label(self.table)
+            label.grid(row=0, column=len(self.header_labels) + 1)
+            self.header_labels.append(label)
+        while len(self.header_labels) > len(columns):
+            self.header_labels.pop().destroy()
+        for label, column in zip(self.header_labels, columns):
+            if label.cget("text") != column:
+                label.config(text=column)
+        self.bind_header.grid(row=0, column=len(columns) + 1)
+        self.columns = columns
+        for index in range(len(self.pool)):
+            self.fit_pool_row(index)
+        self.reset()
+
+    def fit_pool(self):
+        # As many widget rows as fit in the frame; the header row is one of them
+        row_height = self.pool[0]["button"].winfo_reqheight() if self.pool else 30
+        self.set_pool_size(max(self.table.winfo_height() // row_height - 1, 1))
+
+    def set_pool_size(self, count):
+        if count == len(self.pool):
+            return
+        while len(self.pool) < count:
+            index = len(self.pool)
+            label = ttk.Label(self.table)
+            label.grid(row=index + 1, column=0)
+            button = ttk.Button(self.table, text="Bind Target", command=lambda index=index: self.on_bind(self.top_row + index))
+            self.bind_scrolling(label)
+            self.bind_scrolling(button)
+            self.pool.append({"label": label, "entries": [], "button": button})
+            self.fit_pool_row(index)
+        while len(self.pool) > count:
+            row = self.pool.pop()
+            for entry in row["entries"]:
+                del self.cells[str(entry)]
+            for widget in [row["label"], row["button"]] + row["entries"]:
+                widget.destroy()
+        self.redraw()
+
+    def fit_pool_row(self, index):
+        # Match the pool row's entries to the current columns and move its button after them
+        row = self.pool[index]
+        entries = row["entries"]
+        while len(entries) < len(self.columns):
+            entry = ttk.Entry(self.table, validate="key", validatecommand=self.validate_command)
+            entry.grid(row=index + 1, column=len(entries) + 1)
+            entry.bind("<<Paste>>", self.on_paste)
+            self.bind_scrolling(entry)
+            self.cells[str(entry)] = (index, len(entries))
+            entries.append(entry)
+        while len(entries) > len(self.columns):
+            del self.cells[str(entries[-1])]
+            entries.pop().destroy()
+        row["button"].grid(row=index + 1, column=len(self.columns) + 1)
+
+    def redraw(self):
+        self.top_row = max(0, min(self.top_row, self.row_count - len(self.pool)))
+        self.rendering = True  # Writing the entries must not write back into self.data
+        try:
+            for index, row in enumerate(self.pool):
+                data_row = self.top_row + index
+                widgets = [row["label"], row["button"]] + row["entries"]
+                if data_row >= self.row_count:
+                    for widget in widgets:
+                        widget.grid_remove()
+                    continue
+                for widget in widgets:
+                    widget.grid()
+                if not self.columns:
+                    row["button"].grid_remove()  # Nothing to bind before a workflow is loaded
+                row["label"].config(text=str(data_row + 1))
+                state = 'disabled' if self.bound[data_row] else 'normal'
+                for entry, text in zip(row["entries"], self.data[data_row]):
+                    if entry.get() != text:
+                        entry.config(state='normal')
+                        entry.delete(0, tk.END)
+                        entry.insert(0, text)
+                    entry.config(state=state)
+                row["button"].config(state=state)
+        finally:
+            self.rendering = False
+        total, page = self.row_count, len(self.pool)
+        self.scroll_y.set(*((self.top_row / total, min((self.top_row + page) / total, 1.0)) if total else (0, 1)))
+
+    def yview(self, *args):
+        self.top_row = scroll_position(args, self.top_row, self.row_count, len(self.pool))
+        self.redraw()
+
+    def see(self, row):
+        if not self.top_row <= row < self.top_row + len(self.pool):
+            self.top_row = row
+        self.redraw()
+
+    def on_validate(self, text, widget):
+        if not self.validate(text):
+            return False
+        if not self.rendering and widget in self.cells:
+            index, column = self.cells[widget]
+            row = self.top_row + index
+            if row < self.row_count and column < len(self.columns):
+                self.data[row][column] = text
+                if row == self.row_count - 1 and text not in ("", "0"):
+                    self.after_idle(self.add_spare_row)
+        return True
+
+    def add_spare_row(self):
+        # Keep an empty row after the last filled one, so the table grows as it is typed into
+        if any(value not in ("", "0") for value in self.data[-1]) or self.bound[-1]:
+            self.set_row_count(self.row_count + 1)
+
+    def set_row_count(self, count):
+        count = max(count, self.min_rows)
+        del self.data[count:]
+        del self.bound[count:]
+        while len(self.data) < count:
+            self.data.append(["0"] * len(self.columns))
+            self.bound.append(False)
+        self.redraw()
+
+    def set_row(self, index, values, bound):
+        # values maps material to amount; materials not given are 0
+        self.data[index] = [str(values.get(column, 0)) for column in self.columns]
+        self.bound[index] = bound
+        if self.top_row <= index < self.top_row + len(self.pool):
+            self.redraw()
+
+    def set_rows(self, compositions):
+        # Bound targets fill the first rows, followed by one free row (and at least min_rows rows)
+        self.data = [[str(values.get(column, 0)) for column in self.columns] for values in compositions]
+        self.bound = [True] * len(compositions)
+        self.top_row = 0
+        self.set_row_count(len(compositions) + 1)
+
+    def set_bound_rows(self, compositions):
+        # Replace the bound targets and keep the free rows being typed, in their order, after them
+        free = [row for row, bound in zip(self.data, self.bound) if not bound]
+        while free and all(value in ("", "0") for value in free[-1]):
+            free.pop()
+        self.data = [[str(values.get(column, 0)) for column in self.columns] for values in compositions] + free
+        self.bound = [True] * len(compositions) + [False] * len(free)
+        self.set_row_count(len(self.data) + 1)
+
+    def get_row(self, index):
+        return list(self.data[index])
+
+    def first_free_row(self):
+        # First row after the last bound or filled row
+        for index in range(self.row_count - 1, -1, -1):
+            if self.bound[index] or any(value not in ("", "0") for value in self.data[index]):
+                return index + 1
+        return 0
+
+    def fill_rows(self, start_row, start_column, rows):
+        # Write a block of values (one list per row) from start_row/start_column, skipping bound rows
+        # and growing the table as needed. Returns the rows written to.
+        written = []
+        index = start_row
+        for values in rows:
+            while index < self.row_count and self.bound[index]:
+                index += 1
+            if index >= self.row_count:
+                self.data.append(["0"] * len(self.columns))
+                self.bound.append(False)
+            for offset, value in enumerate(values):
+                if start_column + offset < len(self.columns):
+                    self.data[index][start_column + offset] = value
+            written.append(index)
+            index += 1
+        self.set_row_count(max(self.first_free_row() + 1, self.row_count))
+        if written:
+            self.see(written[0])
+        return written
+
+    def on_paste(self, event):
+        # Spreadsheet blocks (tab, comma or semicolon separated) fill the cells from the focused one
+        try:
+            text = self.clipboard_get()
+        except tk.TclError:
+            return "break"
+        rows = [re.split(r"\s*[\t,;]\s*|\s+", line.strip()) for line in text.strip().splitlines() if line.strip()]
+        if len(rows) == 1 and len(rows[0]) == 1:
+            return None  # A single value pastes into the entry as usual
+        invalid = [value for values in rows for value in values if not self.validate(value)]
+        if invalid:
+            messagebox.showwarning("Warning", f"Only whole, non-negative amounts can be pasted (got {invalid[0]!r}).")
+            return "break"
+        index, column = self.cells[str(event.widget)]
+        self.fill_rows(self.top_row + index, column, rows)
+        return "break"
+
+    def reset(self):
+        self.data = []
+        self.bound = []
+        self.top_row = 0
+        self.set_row_count(self.min_rows)
+
 
 class WorkflowWindow(tk.Toplevel):
     def __init__(self, parent):
@@ -258,9 +962,14 @@ class WorkflowWindow(tk.Toplevel):
 
         self.active_sources = [False] * 6  # Initialize active_sources as a class variable
         self.loaded_workflow_file = tk.StringVar(value="No file loaded")  # Variable to hold the name of the loaded workflow file
-        self.target_compositions_df = pd.DataFrame()  # Initialize the dataframe
+        self.target_compositions = None  # CompositionStore of bound targets, created with the table headers
         self.current_workflow_file = None  # Store the current workflow file path
+        self.workflow_store = None  # Journaled store for the current workflow file
+        self.workflow_history = None  # Undo/redo steps of the current workflow file
+        self.write_check_job = None  # after() id of the pending check for background write failures
+        self.workflow_catalogue = workflow_catalogue.WorkflowCatalogue(self.workflow_dir)  # Index of every workflow file
         self.workflow_data = {}  # Store workflow data
+        self.workflow_events = workflow_events.WorkflowEvents(self.after_idle)  # Stages subscribe to the keys they show
         self.create_widgets()
 
     def create_widgets(self):
@@ -270,9 +979,21 @@ class WorkflowWindow(tk.Toplevel):
         self.load_button = ttk.Button(self.top_frame, text="Load Workflow…", command=self.load_workflow)
         self.load_button.pack(side=tk.LEFT, padx=5, pady=5)
 
+        self.browse_button = ttk.Button(self.top_frame, text="Browse Workflows…", command=self.browse_workflows)
+        self.browse_button.pack(side=tk.LEFT, padx=5, pady=5)
+
         self.new_button = ttk.Button(self.top_frame, text="New Workflow…", command=self.new_workflow)
         self.new_button.pack(side=tk.LEFT, padx=5, pady=5)
 
+        self.undo_button = ttk.Button(self.top_frame, text="Undo", command=self.undo, state=tk.DISABLED)
+        self.undo_button.pack(side=tk.LEFT, padx=5, pady=5)
+
+        self.redo_button = ttk.Button(self.top_frame, text="Redo", command=self.redo, state=tk.DISABLED)
+        self.redo_button.pack(side=tk.LEFT, padx=5, pady=5)
+
+        self.bind("<Control-z>", lambda event: self.undo())
+        self.bind("<Control-y>", lambda event: self.redo())
+
         self.loaded_file_label = ttk.Label(self.top_frame, textvariable=self.loaded_workflow_file)
         self.loaded_file_label.pack(side=tk.LEFT, padx=5, pady=5)
 
@@ -295,59 +1016,79 @@ class WorkflowWindow(tk.Toplevel):
 
         self.tabs = {}  # Store tabs to enable/disable them later
 
+        # Stage contents are built the first time their tab is selected
+        self.stage_builders = {
+            "Define Target Compositions": self.create_stage_1_widgets,
+            "Find Boundaries": self.create_find_boundaries_tab,
+            "Learn Sputter Process": self.create_learn_sputter_process_tab,
+        }
+        self.built_stages = set()
+
         for stage in self.workflow_stages:
             tab = ttk.Frame(self.tab_control)
             self.tab_control.add(tab, text=stage)
             self.tabs[stage] = tab
 
-            if stage == "Define Target Compositions":
-                self.create_stage_1_widgets(tab)
-            elif stage == "Find Boundaries":
-                self.create_find_boundaries_tab(tab)
-            elif stage == "Learn Sputter Process":
-                self.create_learn_sputter_process_tab(tab)
+        self.build_stage(self.workflow_stages[0])
+        self.tab_control.bind("<<NotebookTabChanged>>", self.on_tab_changed)
 
-        # Disable all tabs except the first one
-        for i in range(1, len(self.workflow_stages)):
-            self.tab_control.tab(i, state="disabled")
+        # Tabs open as their stage's conditions in stage_gating are met; only the first one is open now
+        self.stage_graph = stage_gating.StageGraph(stage_gating.WORKFLOW_STAGE_RULES)
+        self.stage_graph.reset(self.workflow_data)
+        self.set_stage_states(self.workflow_stages)
+        self.workflow_events.subscribe(self.update_stage_gating, keys=self.stage_graph.keys, prefixes=self.stage_graph.prefixes)
+
+    def update_stage_gating(self, keys):
+        # keys is None when another workflow was loaded or created
+        if keys is None:
+            changed = self.stage_graph.reset(self.workflow_data)
+        else:
+            changed = self.stage_graph.update(self.workflow_data, keys)
+        self.set_stage_states(changed)
+
+    def set_stage_states(self, stages):
+        for stage in stages:
+            self.tab_control.tab(self.workflow_stages.index(stage), state="normal" if self.stage_graph.is_open(stage) else "disabled")
+
+    def on_tab_changed(self, event):
+        stage = self.tab_control.tab(self.tab_control.select(), "text")
+        self.build_stage(stage)
+
+    def build_stage(self, stage):
+        # A stage built later reads the current workflow_data and subscribes to its changes from then on
+        if stage in self.built_stages:
+            return
+        self.built_stages.add(stage)
+        if stage in self.stage_builders:
+            self.stage_builders[stage](self.tabs[stage])
 
     def create_stage_1_widgets(self, tab):
         self.table_label = ttk.Label(tab, text="Targeted Material Compositions")
         self.table_label.pack(pady=5)
 
-        self.table_frame = ttk.Frame(tab)
-        self.table_frame.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
-
-        self.table_headers = []
-        self.table_entries = {}
+        self.table_buttons_frame = ttk.Frame(tab)
+        self.table_buttons_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10)
 
-        for row in range(1, 9):
-            ttk.Label(self.table_frame, text=str(row)).grid(row=row, column=0)
-            self.table_entries[row] = []
+        self.import_targets_button = ttk.Button(self.table_buttons_frame, text="Import Targets…", command=self.import_targets)
+        self.import_targets_button.pack(side=tk.LEFT, padx=5, pady=5)
 
-    def update_table_headers(self):
-        for widget in self.table_frame.winfo_children():
-            widget.destroy()
+        self.generate_targets_button = ttk.Button(self.table_buttons_frame, text="Generate…", command=self.open_generate_popup)
+        self.generate_targets_button.pack(side=tk.LEFT, padx=5, pady=5)
 
-        headers = [sc.materials[i] for i, active in enumerate(self.active_sources) if active]
-        headers.append("Bind Target")  # Add the "Bind Target" header
+        self.bind_all_button = ttk.Button(self.table_buttons_frame, text="Bind All Rows", command=self.bind_all_targets)
+        self.bind_all_button.pack(side=tk.LEFT, padx=5, pady=5)
 
-        self.table_headers = headers
+        self.plan_powers_button = ttk.Button(self.table_buttons_frame, text="Plan Source Powers…", command=self.plan_source_powers)
+        self.plan_powers_button.pack(side=tk.LEFT, padx=5, pady=5)
 
-        for col, header in enumerate(headers):
-            ttk.Label(self.table_frame, text=header).grid(row=0, column=col + 1)
+        self.table_headers = []
+        self.composition_grid = CompositionGrid(tab, self.bind_target, self.validate_positive_integer)
+        self.composition_grid.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
 
-        for row in range(1, 9):
-            ttk.Label(self.table_frame, text=str(row)).grid(row=row, column=0)
-            self.table_entries[row] = []
-            for col in range(len(headers) - 1):  # Adjust for "Bind Target" column
-                entry = ttk.Entry(self.table_frame, validate="key", validatecommand=(self.register(self.validate_positive_integer), '%P'))
-                entry.insert(0, "0")  # Initialize each entry with 0
-                entry.grid(row=row, column=col + 1)
-                self.table_entries[row].append(entry)
-            bind_button = ttk.Button(self.table_frame, text="Bind Target", command=lambda row=row: self.bind_target(row))
-            bind_button.grid(row=row, column=len(headers))
-            self.table_entries[row].append(bind_button)  # Add button to entries for disabling later
+    def update_table_headers(self):
+        headers = [sc.materials[i] for i, active in enumerate(self.active_sources) if active]
+        self.composition_grid.set_columns(headers)
+        self.table_headers = headers + ["Bind Target"]
 
     def validate_positive_integer(self, value_if_allowed):
         if value_if_allowed.isdigit() or value_if_allowed == "":
@@ -355,116 +1096,405 @@ class WorkflowWindow(tk.Toplevel):
         else:
             return False
 
-    def bind_target(self, row):
-        values = [entry.get() for entry in self.table_entries[row] if isinstance(entry, ttk.Entry)]
-        non_zero_values = [int(value) for value in values if value.isdigit() and int(value) > 0]
+    def bindable(self, values):
+        # A target needs at least two non-zero amounts
+        return len([value for value in values if value.isdigit() and int(value) > 0]) >= 2
 
-        if len(non_zero_values) < 2:
+    def bind_target(self, row):
+        if not self.bindable(self.composition_grid.get_row(row)):
             messagebox.showwarning("Warning", "Please enter at least two non-zero values in the row.")
             return
 
         if messagebox.askokcancel("Bind Target", "Bind new target composition to the workflow?"):
-            new_row = {header: value for header, value in zip(self.table_headers[:-1], values)}  # Exclude "Bind Target" column
-            new_row_df = pd.DataFrame([new_row])
-            self.target_compositions_df = pd.concat([self.target_compositions_df, new_row_df], ignore_index=True)
-            print(f"Updated target_compositions_df: {self.target_compositions_df}")  # Debug print
-
-            self.save_workflow()  # Save the updated workflow
-
-            for entry in self.table_entries[row]:
-                entry.config(state='disabled')  # Disable entries
-            self.table_entries[row][-1].config(state='disabled')  # Disable the Bind Target button
-
-            # Enable the next tab if at least one bound target composition exists
-            if not self.target_compositions_df.empty:
-                self.tab_control.tab(1, state="normal")
-            
-            # Update FindBoundariesTab immediately
-            if hasattr(self, 'find_boundaries_tab'):
-                print("Updating dropdown in Find Boundaries tab.")
-                self.find_boundaries_tab.update_workflow_data(self.workflow_data)
-                self.find_boundaries_tab.populate_dropdown()
-                
-            # Update LearnSputterProcessTab immediately
-            if hasattr(self, 'learn_sputter_process_tab'):
-                print("Updating dropdown in Learn Sputter Process tab.")
-                self.learn_sputter_process_tab.update_workflow_data(self.workflow_data)
-                self.learn_sputter_process_tab.populate_dropdown()
-
-            # Check if any EE_LearnMinimumRate model is bound and enable the "Learn Sputter Process" tab
-            if any(key.startswith("EE_LearnMinimumRate_model") for key in self.workflow_data):
-                self.tab_control.tab(2, state="normal")
+            self.bind_rows([row], "Bind target")
+
+    def bind_all_targets(self):
+        rows = [row for row in range(self.composition_grid.row_count)
+                if not self.composition_grid.bound[row] and self.bindable(self.composition_grid.get_row(row))]
+        if not rows:
+            messagebox.showwarning("Warning", "No unbound rows with at least two non-zero values.")
+            return
+        if messagebox.askokcancel("Bind Targets", f"Bind {len(rows)} target compositions to the workflow?"):
+            self.bind_rows(rows, f"Bind {len(rows)} targets")
+
+    def bind_rows(self, rows, label):
+        values = [self.composition_grid.get_row(row) for row in rows]
+        self.target_compositions.extend([[int(value) if value else 0 for value in row_values] for row_values in values])
+
+        self.save_workflow(label)  # Save the updated workflow
+
+        for row, row_values in zip(rows, values):
+            self.composition_grid.set_row(row, dict(zip(self.table_headers[:-1], row_values)), bound=True)  # Disable the row and its Bind Target button
+        self.composition_grid.add_spare_row()
+
+    def import_targets(self):
+        # CSV of amounts: with a header row naming the materials, or one column per active material in order
+        if self.target_compositions is None:
+            messagebox.showwarning("Warning", "Please create or load a workflow first.")
+            return
+        filename = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv"), ("Text files", "*.txt")])
+        if not filename:
+            return
+        with open(filename, 'r', newline='') as file:
+            rows = [[value.strip() for value in row] for row in csv.reader(file) if any(value.strip() for value in row)]
+        materials = self.table_headers[:-1]
+        if rows and any(value in materials for value in rows[0]):
+            header, rows = rows[0], rows[1:]
+            positions = [header.index(material) if material in header else None for material in materials]
+            rows = [[row[i] if i is not None and i < len(row) else "0" for i in positions] for row in rows]
+        invalid = [value for row in rows for value in row if not self.validate_positive_integer(value)]
+        if invalid:
+            messagebox.showerror("Error", f"Only whole, non-negative amounts can be imported (got {invalid[0]!r}).")
+            return
+        written = self.composition_grid.fill_rows(self.composition_grid.first_free_row(), 0, rows)
+        self.loaded_workflow_file.set(f"Imported {len(written)} rows from {os.path.basename(filename)}")
+
+    def open_generate_popup(self):
+        # Fill the table with candidate targets spanning the composition space of the active materials
+        materials = self.table_headers[:-1]
+        if self.target_compositions is None or len(materials) < 2:
+            messagebox.showwarning("Warning", "Please create or load a workflow with at least two active sources first.")
+            return
+
+        popup = tk.Toplevel(self)
+        popup.title("Generate Target Compositions")
+
+        methods = {"Simplex lattice": "lattice", "Latin hypercube": "lhs", "Sobol sequence": "sobol"}
+        method = tk.StringVar(value="Simplex lattice")
+        ttk.Label(popup, text="Method:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
+        ttk.Combobox(popup, textvariable=method, values=list(methods), state="readonly").grid(row=0, column=1, columnspan=2, padx=5, pady=5, sticky=tk.W)
+
+        size = tk.StringVar(value="10")
+        ttk.Label(popup, text="Divisions (lattice) / samples:").grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
+        ttk.Entry(popup, textvariable=size).grid(row=1, column=1, columnspan=2, padx=5, pady=5, sticky=tk.W)
+
+        resolution = tk.StringVar(value="100")
+        ttk.Label(popup, text="Parts per target (samples):").grid(row=2, column=0, padx=5, pady=5, sticky=tk.W)
+        ttk.Entry(popup, textvariable=resolution).grid(row=2, column=1, columnspan=2, padx=5, pady=5, sticky=tk.W)
+
+        min_components = tk.StringVar(value="2")
+        ttk.Label(popup, text="Minimum materials per target:").grid(row=3, column=0, padx=5, pady=5, sticky=tk.W)
+        ttk.Entry(popup, textvariable=min_components).grid(row=3, column=1, columnspan=2, padx=5, pady=5, sticky=tk.W)
+
+        ttk.Label(popup, text="Material").grid(row=4, column=0, padx=5, pady=5, sticky=tk.W)
+        ttk.Label(popup, text="Min %").grid(row=4, column=1, padx=5, pady=5)
+        ttk.Label(popup, text="Max %").grid(row=4, column=2, padx=5, pady=5)
+        bounds = []
+        for i, material in enumerate(materials):
+            low, high = tk.StringVar(value="0"), tk.StringVar(value="100")
+            ttk.Label(popup, text=material).grid(row=5 + i, column=0, padx=5, pady=2, sticky=tk.W)
+            ttk.Entry(popup, textvariable=low, width=8).grid(row=5 + i, column=1, padx=5, pady=2)
+            ttk.Entry(popup, textvariable=high, width=8).grid(row=5 + i, column=2, padx=5, pady=2)
+            bounds.append((low, high))
+
+        def generate():
+            try:
+                count = int(size.get())
+                parts = int(resolution.get())
+                components = int(min_components.get())
+                minimum = [float(low.get()) / 100 for low, high in bounds]
+                maximum = [float(high.get()) / 100 for low, high in bounds]
+                if count < 1 or parts < 1:
+                    raise ValueError("sizes must be positive")
+            except ValueError as e:
+                messagebox.showerror("Error", f"Invalid generator settings: {e}", parent=popup)
+                return
+            # Checked before anything is built: a fine lattice over many sources grows combinatorially
+            candidates = composition_space.candidate_count(methods[method.get()], len(materials), count)
+            if candidates > MAX_GENERATED_CANDIDATES:
+                messagebox.showerror("Error", f"These settings give {candidates} candidate compositions, more than the "
+                                     f"{MAX_GENERATED_CANDIDATES} that can be generated at once. Use fewer divisions or samples.", parent=popup)
+                return
+            if candidates > 10000 and not messagebox.askokcancel("Generate", f"Generate up to {candidates} target compositions?", parent=popup):
+                return
+
+            # Generated on a worker thread; the Tk loop polls for the result
+            result = {}
+
+            def work():
+                try:
+                    store = composition_space.generate(materials, methods[method.get()], count, parts, minimum, maximum, components)
+                    result["rows"] = store.values.astype(int).astype(str).tolist()
+                except ValueError as e:
+                    result["error"] = str(e)
+
+            def check():
+                if not popup.winfo_exists():
+                    return  # Cancelled while generating
+                if worker.is_alive():
+                    popup.after(100, check)
+                    return
+                if "error" in result:
+                    messagebox.showerror("Error", result["error"], parent=popup)
+                    generate_button.config(state=tk.NORMAL, text="Generate")
+                    return
+                rows = result["rows"]
+                if not rows:
+                    messagebox.showwarning("Warning", "No compositions satisfy the constraints.", parent=popup)
+                    generate_button.config(state=tk.NORMAL, text="Generate")
+                    return
+                self.composition_grid.fill_rows(self.composition_grid.first_free_row(), 0, rows)
+                self.loaded_workflow_file.set(f"Generated {len(rows)} target compositions")
+                popup.destroy()
+
+            generate_button.config(state=tk.DISABLED, text="Generating...")
+            worker = threading.Thread(target=work, name="generate-compositions", daemon=True)
+            worker.start()
+            popup.after(100, check)
+
+        button_frame = ttk.Frame(popup)
+        button_frame.grid(row=5 + len(materials), column=0, columnspan=3, pady=10)
+        generate_button = ttk.Button(button_frame, text="Generate", command=generate)
+        generate_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=popup.destroy).pack(side=tk.LEFT, padx=5)
+
+    def plan_source_powers(self):
+        # Source powers for every bound target from the workflow's bound rate models
+        if self.target_compositions is None or not len(self.target_compositions):
+            messagebox.showwarning("Warning", "Please bind at least one target composition first.")
+            return
+        materials = self.workflow_data.get("target materials", sc.materials)
+        try:
+            plan = power_solver.plan_workflow(self.workflow_data, self.target_compositions, materials, sc.max_powers, SDL_REPORTS_DIR)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Could not plan source powers: {e}")
+            return
+        indices = [materials.index(material) for material in self.target_compositions.materials]
+
+        popup = tk.Toplevel(self)
+        popup.title("Planned Source Powers")
+        popup.geometry("800x500")
+        ttk.Label(popup, text=plan.summary(), justify=tk.LEFT).pack(side=tk.TOP, anchor=tk.W, padx=10, pady=10)
+
+        columns = [f"{material} (W)" for material in self.target_compositions.materials] + ["Margin (W)", "Feasible"]
+        tree = ttk.Treeview(popup, columns=columns)
+        tree.heading("#0", text="Target")
+        tree.column("#0", width=120)
+        for column in columns:
+            tree.heading(column, text=column)
+            tree.column(column, width=90, anchor=tk.CENTER)
+        scrollbar = ttk.Scrollbar(popup, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+
+        margins = plan.margins[:, indices].min(axis=1)
+        for row, amounts in enumerate(self.target_compositions.values):
+            powers = [f"{power:.1f}" for power in plan.powers[row, indices]]
+            feasible = "Yes" if plan.feasible[row] else plan.reasons[row]
+            tree.insert("", tk.END, text=":".join(f"{amount:g}" for amount in amounts), values=powers + [f"{margins[row]:.1f}", feasible])
+
+        def export():
+            filename = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")], parent=popup)
+            if filename:
+                table = self.target_compositions.to_dataframe()
+                for index, material in zip(indices, self.target_compositions.materials):
+                    table[f"{material} power (W)"] = plan.powers[:, index]
+                table["margin (W)"] = margins
+                table["feasible"] = plan.feasible
+                table["reason"] = plan.reasons
+                table.to_csv(filename, index=False)
+
+        button_frame = ttk.Frame(popup)
+        button_frame.pack(side=tk.BOTTOM, pady=10)
+        ttk.Button(button_frame, text="Export CSV…", command=export).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Close", command=popup.destroy).pack(side=tk.LEFT, padx=5)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(expand=True, fill=tk.BOTH, padx=10, pady=5)
 
     def load_workflow(self):
         filename = filedialog.askopenfilename(initialdir=self.workflow_dir, filetypes=[("JSON files", "*.json")])
         if filename:
-            self.current_workflow_file = filename
-            with open(filename, 'r') as file:
-                self.workflow_data = json.load(file)
-                print(f"Workflow data loaded: {self.workflow_data}")
-                self.populate_workflow(self.workflow_data)
-                self.loaded_workflow_file.set(f"Loaded: {os.path.basename(filename)}")
-                # Enable the second tab if there is at least one bound target composition
-                if "target_compositions" in self.workflow_data and self.workflow_data["target_compositions"]:
-                    self.target_compositions_df = pd.DataFrame(self.workflow_data["target_compositions"])
-                    self.tab_control.tab(1, state="normal")
-                    # Restore bound target compositions in the table and disable their fields
-                    for row_index, composition in enumerate(self.workflow_data["target_compositions"], start=1):
-                        for col_index, (header, value) in enumerate(composition.items()):
-                            if header in self.table_headers[:-1]:  # Exclude "Bind Target" column
-                                entry = self.table_entries[row_index][self.table_headers.index(header)]
-                                entry.delete(0, tk.END)
-                                entry.insert(0, value)
-                                entry.config(state='disabled')
-                        self.table_entries[row_index][-1].config(state='disabled')  # Disable the Bind Target button
-                # Update the dropdown in Find Boundaries tab
-                if hasattr(self, 'find_boundaries_tab'):
-                    print("Updating dropdown in Find Boundaries tab.")
-                    self.find_boundaries_tab.update_workflow_data(self.workflow_data)
-                # Update the dropdown in Learn Sputter Process tab
-                if hasattr(self, 'learn_sputter_process_tab'):
-                    print("Updating dropdown in Learn Sputter Process tab.")
-                    self.learn_sputter_process_tab.update_workflow_data(self.workflow_data)
-
-                # Enable the Learn Sputter Process tab if there is a bound EE_LearnMinimumRate model
-                if any(key.startswith("EE_LearnMinimumRate_model") for key in self.workflow_data):
-                    self.tab_control.tab(2, state="normal")
-
-    def save_workflow(self):
+            self.open_workflow_file(filename)
+
+    def browse_workflows(self):
+        # Only files changed since the last browse are read; the rest comes from the saved index
+        self.workflow_catalogue.refresh()
+
+        popup = tk.Toplevel(self)
+        popup.title("Browse Workflows")
+        popup.geometry("750x450")
+
+        search_frame = ttk.Frame(popup)
+        search_frame.pack(side=tk.TOP, fill=tk.X, padx=10, pady=10)
+        ttk.Label(search_frame, text="Search:").pack(side=tk.LEFT, padx=5)
+        search_text = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=search_text)
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        compatible_only = tk.BooleanVar(value=True)
+        ttk.Checkbutton(search_frame, text="Runnable with current sources only", variable=compatible_only, command=lambda: update_list()).pack(side=tk.LEFT, padx=5)
+
+        columns = ("materials", "targets", "models", "runnable")
+        tree = ttk.Treeview(popup, columns=columns, selectmode="browse")
+        tree.heading("#0", text="File")
+        tree.heading("materials", text="Active materials")
+        tree.heading("targets", text="Bound targets")
+        tree.heading("models", text="Bound models")
+        tree.heading("runnable", text="Runnable")
+        tree.column("#0", width=220)
+        tree.column("materials", width=220)
+        for column in ("targets", "models", "runnable"):
+            tree.column(column, width=90, anchor=tk.CENTER)
+        tree.pack(expand=True, fill=tk.BOTH, padx=10, pady=5)
+
+        def update_list(*args):
+            tree.delete(*tree.get_children())
+            entries = self.workflow_catalogue.search(search_text.get(), sc.materials, compatible_only.get())
+            for entry in entries:
+                if entry["error"]:
+                    runnable = entry["error"]
+                else:
+                    runnable = "Yes" if self.workflow_catalogue.is_compatible(entry, sc.materials) else "No"
+                tree.insert("", tk.END, iid=entry["name"], text=entry["name"],
+                            values=(", ".join(entry["active_materials"]), entry["target_count"], len(entry["model_keys"]), runnable))
+
+        def open_selected(*args):
+            selection = tree.selection()
+            if selection:
+                popup.destroy()
+                self.open_workflow_file(os.path.join(self.workflow_dir, selection[0]))
+
+        search_text.trace_add("write", update_list)
+        tree.bind("<Double-1>", open_selected)
+        update_list()
+        search_entry.focus_set()
+
+        button_frame = ttk.Frame(popup)
+        button_frame.pack(side=tk.BOTTOM, pady=10)
+        ttk.Button(button_frame, text="Open", command=open_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=popup.destroy).pack(side=tk.LEFT, padx=5)
+
+    def open_workflow_file(self, filename):
+        # Reject malformed files up front instead of failing half way through populating the window.
+        # The current workflow's writes land first, in case the same file is being reopened.
+        if self.workflow_store is not None:
+            try:
+                self.flush_workflow()
+            except workflow_store.WorkflowWriteError as e:
+                self.report_write_error(e)
+        store = None
+        try:
+            store = workflow_store.WorkflowStore(filename)
+            errors = workflow_schema.validate_workflow(store.data)
+        except (OSError, ValueError) as e:
+            errors = [f"unreadable: {e}"]
+        if errors:
+            if store is not None:
+                store.close()
+            shown = "\n".join(errors[:10]) + (f"\n... and {len(errors) - 10} more" if len(errors) > 10 else "")
+            messagebox.showerror("Invalid Workflow", f"{os.path.basename(filename)} is not a valid workflow file:\n\n{shown}")
+            return
+        self.current_workflow_file = filename
+        self.open_workflow_store(filename, store=store)
+        self.workflow_data = self.workflow_store.copy()
+        self.show_workflow_data()
+        self.workflow_events.replaced_all()
+        self.loaded_workflow_file.set(f"Loaded: {os.path.basename(filename)}")
+
+    def show_workflow_data(self, keep_free_rows=False):
+        # Bring the table, the stage tabs and their dropdowns in line with self.workflow_data
+        self.populate_workflow(self.workflow_data, keep_free_rows)
+        self.target_compositions = composition_store.CompositionStore.from_records(self.table_headers[:-1], self.workflow_data.get("target_compositions", []))
+        self.update_history_buttons()
+
+    def undo(self):
+        self.step_history(self.workflow_history.undo if self.workflow_history else None, "Undid")
+
+    def redo(self):
+        self.step_history(self.workflow_history.redo if self.workflow_history else None, "Redid")
+
+    def step_history(self, step, verb):
+        try:
+            result = step() if step else None
+        except workflow_store.WorkflowWriteError as e:
+            self.report_write_error(e)
+            return
+        if result is None:
+            return
+        label, ops = result
+        # Only the changed keys are touched; the tabs share self.workflow_data and see the change
+        for op in ops:
+            workflow_store.apply_op(self.workflow_data, json.loads(json.dumps(op)))
+        self.show_workflow_data(keep_free_rows=True)  # Rows being typed are not part of the history
+        self.workflow_events.changed(op["key"] for op in ops)
+        self.loaded_workflow_file.set(f"{verb}: {label}")
+        self.watch_workflow_writes()
+
+    def flush_workflow(self):
+        # Fold the history journal in and wait until everything is on disk; raises WorkflowWriteError
+        self.workflow_history.close()
+        self.workflow_store.compact()
+        self.workflow_store.flush()
+
+    def watch_workflow_writes(self):
+        # Saves are written in the background; check for failures once they have been attempted
+        if self.write_check_job is None:
+            self.write_check_job = self.after(200, self.check_workflow_writes)
+
+    def check_workflow_writes(self):
+        self.write_check_job = None
+        if self.workflow_store is None:
+            return
+        if not self.workflow_store.idle:
+            self.watch_workflow_writes()
+            return
+        try:
+            self.workflow_store.check()
+        except workflow_store.WorkflowWriteError as e:
+            self.report_write_error(e)
+
+    def report_write_error(self, error):
+        self.loaded_workflow_file.set(f"Not saved: {os.path.basename(self.workflow_store.path)}")
+        messagebox.showerror("Save Failed", f"{error}\n\nThe workflow shown is newer than the file. The whole workflow is written again with the next change.")
+
+    def update_history_buttons(self):
+        history = self.workflow_history
+        undo_label = history.next_undo_label() if history else None
+        redo_label = history.next_redo_label() if history else None
+        self.undo_button.config(state=tk.NORMAL if undo_label else tk.DISABLED, text=f"Undo {undo_label}" if undo_label else "Undo")
+        self.redo_button.config(state=tk.NORMAL if redo_label else tk.DISABLED, text=f"Redo {redo_label}" if redo_label else "Redo")
+
+    def open_workflow_store(self, filename, data=None, store=None):
+        # Close the previous workflow's store (folding its journal into the file) and open the new one;
+        # closing waits for its writes, so reopening the same file reads everything saved. store is
+        # an already opened store for filename; data creates the file with that content.
+        if self.workflow_store is not None:
+            self.workflow_history.close()
+            try:
+                self.workflow_store.close()
+            except workflow_store.WorkflowWriteError as e:
+                self.report_write_error(e)
+        if data is None:
+            self.workflow_store = store or workflow_store.WorkflowStore(filename)
+            self.workflow_history = workflow_history.WorkflowHistory(self.workflow_store)
+        else:
+            self.workflow_store = workflow_store.WorkflowStore.create(filename, data)
+            self.workflow_history = workflow_history.WorkflowHistory(self.workflow_store)
+            self.workflow_history.clear()  # A new file starts without history
+        self.update_history_buttons()
+
+    def save_workflow(self, label="Edit workflow"):
         if self.current_workflow_file:
-            with open(self.current_workflow_file, 'r') as file:
-                data = json.load(file)
-            data["target_compositions"] = self.target_compositions_df.to_dict(orient='records')
-            with open(self.current_workflow_file, 'w') as file:
-                json.dump(data, file)
+            # Only the keys that changed are appended to the workflow's journal, off the UI thread,
+            # and recorded as one undo step
+            self.workflow_data["target_compositions"] = self.target_compositions.to_records()
+            try:
+                ops = self.workflow_history.commit(self.workflow_data, label)
+            except workflow_store.WorkflowWriteError as e:
+                self.report_write_error(e)
+                return
+            self.workflow_events.changed(op["key"] for op in ops)
+            self.update_history_buttons()
             self.loaded_workflow_file.set(f"Saved: {os.path.basename(self.current_workflow_file)}")
+            self.watch_workflow_writes()
         else:
             filename = filedialog.asksaveasfilename(initialdir=self.workflow_dir, defaultextension=".json", filetypes=[("JSON files", "*.json")])
             if filename:
-                data = self.extract_workflow_data()
-                data["target_compositions"] = self.target_compositions_df.to_dict(orient='records')
-                with open(filename, 'w') as file:
-                    json.dump(data, file)
+                self.open_workflow_store(filename, self.extract_workflow_data())
                 self.loaded_workflow_file.set(f"Saved: {os.path.basename(filename)}")
                 self.current_workflow_file = filename
-
-        # Enable the Learn Sputter Process tab if there is a bound EE_LearnMinimumRate model
-        if any(key.startswith("EE_LearnMinimumRate_model") for key in self.workflow_data):
-            self.tab_control.tab(2, state="normal")
-
+                self.workflow_data = self.workflow_store.copy()
+                self.workflow_events.replaced_all()
 
     def new_workflow(self):
-        # Clear current entries to start a new workflow
-        for entry_list in self.table_entries.values():
-            for entry in entry_list:
-                if isinstance(entry, ttk.Entry):
-                    entry.delete(0, tk.END)
-                elif isinstance(entry, ttk.Button):
-                    entry.config(state='normal')  # Reset button state to normal
-
-        # Reset target compositions DataFrame
-        self.target_compositions_df = pd.DataFrame()
-
         # Create the "choose active sources" popup window
         popup = tk.Toplevel(self)
         popup.title("Choose Active Sources")
@@ -491,23 +1521,16 @@ class WorkflowWindow(tk.Toplevel):
                         "target materials": sc.materials,
                         "active_sources": self.active_sources
                     }
-                    with open(filename, 'w') as file:
-                        json.dump(workflow_data, file)
+                    self.open_workflow_store(filename, workflow_data)
                     self.loaded_workflow_file.set(f"Created: {os.path.basename(filename)}")
+                    # Clear the current entries only now; cancelling keeps the loaded workflow intact
+                    self.composition_grid.reset()
                     self.update_table_headers()
+                    self.target_compositions = composition_store.CompositionStore(self.table_headers[:-1])
                     self.current_workflow_file = filename
                     self.workflow_data = workflow_data  # Update workflow_data with the new workflow
                     popup.destroy()
-
-                    # Reset and update FindBoundariesTab
-                    if hasattr(self, 'find_boundaries_tab'):
-                        self.find_boundaries_tab.reset_state()
-                        self.find_boundaries_tab.update_workflow_data(self.workflow_data)
-
-                    # Reset and update LearnSputterProcessTab
-                    if hasattr(self, 'learn_sputter_process_tab'):
-                        self.learn_sputter_process_tab.reset_state()
-                        self.learn_sputter_process_tab.update_workflow_data(self.workflow_data)
+                    self.workflow_events.replaced_all()  # Stages reset and show the new workflow
 
         def cancel():
             popup.destroy()
@@ -520,29 +1543,23 @@ class WorkflowWindow(tk.Toplevel):
         cancel_button.grid(row=2, column=3, padx=10, pady=10)
 
     def extract_workflow_data(self):
-        data = {}
-        for row, entry_list in self.table_entries.items():
-            data[row] = [entry.get() for entry in entry_list if isinstance(entry, ttk.Entry)]
-        return data
+        # The window's state as a workflow document, in the shape workflow_schema accepts
+        return {
+            "target materials": list(sc.materials),
+            "active_sources": [bool(active) for active in self.active_sources],
+            "target_compositions": self.target_compositions.to_records() if self.target_compositions is not None else [],
+        }
 
-    def populate_workflow(self, data):
-        print(f"Populating workflow with data: {data}")
+    def populate_workflow(self, data, keep_free_rows=False):
         self.active_sources = data.get("active_sources", [False] * 6)
-        self.update_table_headers()
-
-        if "target_compositions" in data:
-            for row_index, composition in enumerate(data["target_compositions"], start=1):
-                for col_index, (header, value) in enumerate(composition.items()):
-                    if header in self.table_headers[:-1]:  # Exclude "Bind Target" column
-                        entry = self.table_entries[row_index][self.table_headers.index(header)]
-                        entry.delete(0, tk.END)
-                        entry.insert(0, value)
-                        entry.config(state='disabled')
-                # Disable the Bind Target button for this row
-                self.table_entries[row_index][-1].config(state='disabled')
+        self.update_table_headers()  # Clears the free rows if the columns changed
 
-            # Enable the next tab if there is at least one bound target composition
-            self.tab_control.tab(1, state="normal")
+        # Bound targets fill the first rows (disabled), followed by free rows
+        compositions = data.get("target_compositions", [])
+        if keep_free_rows:
+            self.composition_grid.set_bound_rows(compositions)
+        else:
+            self.composition_grid.set_rows(compositions)
 
     def create_find_boundaries_tab(self, tab):
         # Create the "Find Boundaries" tab widgets here
@@ -552,9 +1569,22 @@ class WorkflowWindow(tk.Toplevel):
         # Create the "Learn Sputter Process" tab widgets here
         self.learn_sputter_process_tab = LearnSputterProcessTab(tab, self.workflow_data, self)
 
+    def refresh(self):
+        # The source configuration may have been edited while the window was hidden
+        target_materials = self.workflow_data.get("target materials")
+        if target_materials is not None and target_materials != sc.materials:
+            self.run_button.config(state='disabled')
+        else:
+            self.run_button.config(state='normal')
+
     def on_close(self):
-        self.parent.deiconify()
-        self.destroy()
+        if self.workflow_store is not None:
+            # The window is only hidden and keeps its store; make sure everything is on disk
+            try:
+                self.flush_workflow()
+            except workflow_store.WorkflowWriteError as e:
+                self.report_write_error(e)
+        self.parent.window_manager.hide(self)
 
 
 class FindBoundariesTab:
@@ -565,8 +1595,10 @@ class FindBoundariesTab:
         self.target_materials = []
         self.source_numbers = []
         self.learning_data_dfs = {}  # Initialize a dictionary to store DataFrames for each source_number
+        self.training_load = None  # LearningDataLoad in progress
         self.create_widgets()
         self.populate_dropdown()
+        self.workflow_window.workflow_events.subscribe(self.on_workflow_changed, keys=("target materials", "active_sources"), prefixes=("EE_LearnMinimumRate_model_",))
 
     def create_widgets(self):
         # Main frame for the tab
@@ -645,24 +1677,36 @@ class FindBoundariesTab:
         self.bind_current_model_button.config(state=tk.DISABLED)
         self.re_evaluate_model_button.config(state=tk.DISABLED)
         self.learning_data_dfs.clear()  # Clear learning data
+        if self.training_load is not None:
+            self.training_load = None
+            self.add_training_data_button.config(text="Add training data", state=tk.NORMAL)
         self.populate_dropdown()  # Refresh the dropdown
 
     def populate_dropdown(self):
         # Extract target materials and source numbers based on active sources
-        print(f"Populating dropdown with workflow data: {self.workflow_data}")
         target_materials = self.workflow_data.get("target materials", [])
         active_sources = self.workflow_data.get("active_sources", [])
 
         self.target_materials = [material for i, material in enumerate(target_materials) if active_sources[i]]
         self.source_numbers = [i + 1 for i, active in enumerate(active_sources) if active]
 
-        print(f"Target materials: {self.target_materials}")
         self.selection_dropdown['values'] = self.target_materials
         self.selection_dropdown.set('')  # Clear the current selection
 
-    def update_workflow_data(self, workflow_data):
-        self.workflow_data = workflow_data
-        self.populate_dropdown()
+
+    def on_workflow_changed(self, keys):
+        # keys is None when another workflow was loaded or created
+        self.workflow_data = self.workflow_window.workflow_data
+        if keys is None:
+            self.reset_state()
+        elif keys & {"target materials", "active_sources"}:
+            self.populate_dropdown()
+        else:
+            selected_material = self.selection_var.get()
+            if selected_material:
+                self.update_bound_model_label(selected_material)
+                bound = f"EE_LearnMinimumRate_model_{selected_material}" in self.workflow_data
+                self.re_evaluate_model_button.config(state=tk.NORMAL if bound else tk.DISABLED)
 
     def on_dropdown_selection(self, event):
         selected_material = self.selection_var.get()
@@ -712,24 +1756,18 @@ class FindBoundariesTab:
             return
 
         source_number = sc.materials.index(selected_material) + 1
-        base_dir = "C:/Users/jonsc690/Documents/BEA-supervisor/SDL_reports"
-        folders = [f for f in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, f)) and "EE_LearnMinimumRate" in f and f"([{source_number}])" in f]
+        SDL_RUNS.refresh()
+        runs = [run for run in SDL_RUNS.query("EE_LearnMinimumRate", (source_number,)) if run["has_learning_data"]]
 
-        if not folders:
+        if not runs:
             messagebox.showwarning("Warning", "No matching folders found.")
             return
 
-        stripped_folders = [f[:9] for f in folders]
-        selected_folders = self.select_folders(stripped_folders)
-        if not selected_folders:
+        selected_runs = self.select_folders([run["timestamp"] for run in runs])
+        if not selected_runs:
             return
 
-        for folder in selected_folders:
-            full_path = os.path.join(base_dir, folder)
-            self.training_sets_listbox.insert(tk.END, full_path)
-            self.load_training_data(full_path, source_number)
-
-        self.update_training_data_text(source_number)
+        self.load_training_data([SDL_RUNS.path(runs[index]) for index in selected_runs], source_number)
 
     def select_folders(self, folders):
         popup = tk.Toplevel(self.parent)
@@ -742,7 +1780,7 @@ class FindBoundariesTab:
         listbox.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
 
         def on_ok():
-            popup.selected_folders = [folders[i] for i in listbox.curselection()]
+            popup.selected_folders = list(listbox.curselection())  # Indices into folders
             popup.destroy()
 
         def on_cancel():
@@ -760,28 +1798,36 @@ class FindBoundariesTab:
 
         return popup.selected_folders
 
-    def load_training_data(self, folder, source_number):
-        csv_path = os.path.join(folder, "learning_data.csv")
-        if not os.path.isfile(csv_path):
-            messagebox.showwarning("Warning", f"No learning data found in {folder}.")
-            return
-
-        try:
-            new_data = pd.read_csv(csv_path)
-        except Exception as e:
-            messagebox.showerror("Error", f"Error reading learning data file: {e}")
-            return
-
+    def load_training_data(self, folders, source_number):
+        # Read the files in the background; they are added together once all have been read
+        columns = None
         if source_number in self.learning_data_dfs and not self.learning_data_dfs[source_number].empty:
-            if not self.learning_data_dfs[source_number].columns.equals(new_data.columns):
-                messagebox.showerror("Error", "Headers of the learning data files do not match. The new file will not be loaded.")
-                return
+            columns = self.learning_data_dfs[source_number].columns.drop('folder_path')
+        self.training_load = learning_data.LearningDataLoad(folders, columns)
+        self.add_training_data_button.config(state=tk.DISABLED)
+        self.check_training_data_load(self.training_load, source_number)
+
+    def check_training_data_load(self, load, source_number):
+        if load is not self.training_load:
+            return  # Superseded, e.g. another workflow was loaded meanwhile
+        if not load.finished:
+            self.add_training_data_button.config(text=f"Loading training data {load.done}/{load.total}...")
+            self.parent.after(100, self.check_training_data_load, load, source_number)
+            return
+        self.training_load = None
+        self.add_training_data_button.config(text="Add training data", state=tk.NORMAL)
 
-        new_data['folder_path'] = folder  # Add folder path to the DataFrame for later reference
-        if source_number not in self.learning_data_dfs:
-            self.learning_data_dfs[source_number] = new_data
-        else:
-            self.learning_data_dfs[source_number] = pd.concat([self.learning_data_dfs[source_number], new_data], ignore_index=True)
+        new_data, loaded, errors = load.result()
+        if new_data is not None:
+            if source_number not in self.learning_data_dfs or self.learning_data_dfs[source_number].empty:
+                self.learning_data_dfs[source_number] = new_data
+            else:
+                self.learning_data_dfs[source_number] = pd.concat([self.learning_data_dfs[source_number], new_data], ignore_index=True)
+            for folder in loaded:
+                self.training_sets_listbox.insert(tk.END, folder)
+            self.update_training_data_text(source_number)
+        if errors:
+            messagebox.showerror("Error", "These learning data files were not loaded:\n" + "\n".join(errors))
 
     def update_training_data_text(self, source_number):
         # Clear the text widget
@@ -896,13 +1942,9 @@ class FindBoundariesTab:
             return
 
         source_number = sc.materials.index(selected_material) + 1
-        base_dir = "C:/Users/jonsc690/Documents/BEA-supervisor/SDL_reports"
-        folders = [f for f in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, f)) and "EE_LearnMinimumRate" in f and f"([{source_number}])" in f]
-
-        stripped_folders = [f[:9] for f in folders]
-
-        for folder in stripped_folders:
-            listbox.insert(tk.END, folder)
+        SDL_RUNS.refresh()
+        for run in SDL_RUNS.query("EE_LearnMinimumRate", (source_number,)):
+            listbox.insert(tk.END, run["timestamp"])
 
         def on_ok():
             selection = listbox.curselection()
@@ -958,10 +2000,8 @@ class FindBoundariesTab:
                 messagebox.showwarning("Warning", f"There is already a model bound to this workflow for {selected_material}.")
             else:
                 self.workflow_data[source_key] = self.selected_model_name
-                self.workflow_window.save_workflow()  # Call save_workflow through the WorkflowWindow reference
+                self.workflow_window.save_workflow(f"Bind model for {selected_material}")  # Call save_workflow through the WorkflowWindow reference
                 messagebox.showinfo("Model Bound", f"Model '{self.selected_model_name}' has been bound to the workflow for {selected_material}.")
-                self.update_bound_model_label(selected_material)
-                self.re_evaluate_model_button.config(state=tk.NORMAL)
         else:
             messagebox.showwarning("Warning", "No model selected to bind.")
 
@@ -990,8 +2030,10 @@ class LearnSputterProcessTab:
         self.target_materials = []
         self.source_numbers = []
         self.learning_data_dfs = {}  # Initialize a dictionary to store DataFrames for each source_number
+        self.training_load = None  # LearningDataLoad in progress
         self.create_widgets()
         self.populate_dropdown()
+        self.workflow_window.workflow_events.subscribe(self.on_workflow_changed, keys=("target materials", "active_sources"), prefixes=("SJ_LearnSputterProcess_model_",))
 
     def create_widgets(self):
         # Main frame for the tab
@@ -1070,24 +2112,36 @@ class LearnSputterProcessTab:
         self.bind_current_model_button.config(state=tk.DISABLED)
         self.re_evaluate_model_button.config(state=tk.DISABLED)
         self.learning_data_dfs.clear()  # Clear learning data
+        if self.training_load is not None:
+            self.training_load = None
+            self.add_training_data_button.config(text="Add training data", state=tk.NORMAL)
         self.populate_dropdown()  # Refresh the dropdown
 
     def populate_dropdown(self):
         # Extract target materials and source numbers based on active sources
-        print(f"Populating dropdown with workflow data: {self.workflow_data}")
         target_materials = self.workflow_data.get("target materials", [])
         active_sources = self.workflow_data.get("active_sources", [])
 
         self.target_materials = [material for i, material in enumerate(target_materials) if active_sources[i]]
         self.source_numbers = [i + 1 for i, active in enumerate(active_sources) if active]
 
-        print(f"Target materials: {self.target_materials}")
         self.selection_dropdown['values'] = self.target_materials
         self.selection_dropdown.set('')  # Clear the current selection
 
-    def update_workflow_data(self, workflow_data):
-        self.workflow_data = workflow_data
-        self.populate_dropdown()
+
+    def on_workflow_changed(self, keys):
+        # keys is None when another workflow was loaded or created
+        self.workflow_data = self.workflow_window.workflow_data
+        if keys is None:
+            self.reset_state()
+        elif keys & {"target materials", "active_sources"}:
+            self.populate_dropdown()
+        else:
+            selected_material = self.selection_var.get()
+            if selected_material:
+                self.update_bound_model_label(selected_material)
+                bound = f"SJ_LearnSputterProcess_model_{selected_material}" in self.workflow_data
+                self.re_evaluate_model_button.config(state=tk.NORMAL if bound else tk.DISABLED)
 
     def on_dropdown_selection(self, event):
         selected_material = self.selection_var.get()
@@ -1137,24 +2191,18 @@ class LearnSputterProcessTab:
             return
 
         source_number = sc.materials.index(selected_material) + 1
-        base_dir = "C:/Users/jonsc690/Documents/BEA-supervisor/SDL_reports"
-        folders = [f for f in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, f)) and "SJ_LearnSputterProcess" in f and f"([{source_number}])" in f]
+        SDL_RUNS.refresh()
+        runs = [run for run in SDL_RUNS.query("SJ_LearnSputterProcess", (source_number,)) if run["has_learning_data"]]
 
-        if not folders:
+        if not runs:
             messagebox.showwarning("Warning", "No matching folders found.")
             return
 
-        stripped_folders = [f[:9] for f in folders]
-        selected_folders = self.select_folders(stripped_folders)
-        if not selected_folders:
+        selected_runs = self.select_folders([run["timestamp"] for run in runs])
+        if not selected_runs:
             return
 
-        for folder in selected_folders:
-            full_path = os.path.join(base_dir, folder)
-            self.training_sets_listbox.insert(tk.END, full_path)
-            self.load_training_data(full_path, source_number)
-
-        self.update_training_data_text(source_number)
+        self.load_training_data([SDL_RUNS.path(runs[index]) for index in selected_runs], source_number)
 
     def select_folders(self, folders):
         popup = tk.Toplevel(self.parent)
@@ -1167,7 +2215,7 @@ class LearnSputterProcessTab:
         listbox.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
 
         def on_ok():
-            popup.selected_folders = [folders[i] for i in listbox.curselection()]
+            popup.selected_folders = list(listbox.curselection())  # Indices into folders
             popup.destroy()
 
         def on_cancel():
@@ -1185,28 +2233,36 @@ class LearnSputterProcessTab:
 
         return popup.selected_folders
 
-    def load_training_data(self, folder, source_number):
-        csv_path = os.path.join(folder, "learning_data.csv")
-        if not os.path.isfile(csv_path):
-            messagebox.showwarning("Warning", f"No learning data found in {folder}.")
-            return
-
-        try:
-            new_data = pd.read_csv(csv_path)
-        except Exception as e:
-            messagebox.showerror("Error", f"Error reading learning data file: {e}")
-            return
-
+    def load_training_data(self, folders, source_number):
+        # Read the files in the background; they are added together once all have been read
+        columns = None
         if source_number in self.learning_data_dfs and not self.learning_data_dfs[source_number].empty:
-            if not self.learning_data_dfs[source_number].columns.equals(new_data.columns):
-                messagebox.showerror("Error", "Headers of the learning data files do not match. The new file will not be loaded.")
-                return
+            columns = self.learning_data_dfs[source_number].columns.drop('folder_path')
+        self.training_load = learning_data.LearningDataLoad(folders, columns)
+        self.add_training_data_button.config(state=tk.DISABLED)
+        self.check_training_data_load(self.training_load, source_number)
+
+    def check_training_data_load(self, load, source_number):
+        if load is not self.training_load:
+            return  # Superseded, e.g. another workflow was loaded meanwhile
+        if not load.finished:
+            self.add_training_data_button.config(text=f"Loading training data {load.done}/{load.total}...")
+            self.parent.after(100, self.check_training_data_load, load, source_number)
+            return
+        self.training_load = None
+        self.add_training_data_button.config(text="Add training data", state=tk.NORMAL)
 
-        new_data['folder_path'] = folder  # Add folder path to the DataFrame for later reference
-        if source_number not in self.learning_data_dfs:
-            self.learning_data_dfs[source_number] = new_data
-        else:
-            self.learning_data_dfs[source_number] = pd.concat([self.learning_data_dfs[source_number], new_data], ignore_index=True)
+        new_data, loaded, errors = load.result()
+        if new_data is not None:
+            if source_number not in self.learning_data_dfs or self.learning_data_dfs[source_number].empty:
+                self.learning_data_dfs[source_number] = new_data
+            else:
+                self.learning_data_dfs[source_number] = pd.concat([self.learning_data_dfs[source_number], new_data], ignore_index=True)
+            for folder in loaded:
+                self.training_sets_listbox.insert(tk.END, folder)
+            self.update_training_data_text(source_number)
+        if errors:
+            messagebox.showerror("Error", "These learning data files were not loaded:\n" + "\n".join(errors))
 
     def update_training_data_text(self, source_number):
         # Clear the text widget
@@ -1321,13 +2377,9 @@ class LearnSputterProcessTab:
             return
 
         source_number = sc.materials.index(selected_material) + 1
-        base_dir = "C:/Users/jonsc690/Documents/BEA-supervisor/SDL_reports"
-        folders = [f for f in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, f)) and "SJ_LearnSputterProcess" in f and f"([{source_number}])" in f]
-
-        stripped_folders = [f[:9] for f in folders]
-
-        for folder in stripped_folders:
-            listbox.insert(tk.END, folder)
+        SDL_RUNS.refresh()
+        for run in SDL_RUNS.query("SJ_LearnSputterProcess", (source_number,)):
+            listbox.insert(tk.END, run["timestamp"])
 
         def on_ok():
             selection = listbox.curselection()
@@ -1383,10 +2435,8 @@ class LearnSputterProcessTab:
                 messagebox.showwarning("Warning", f"There is already a model bound to this workflow for {selected_material}.")
             else:
                 self.workflow_data[source_key] = self.selected_model_name
-                self.workflow_window.save_workflow()  # Call save_workflow through the WorkflowWindow reference
+                self.workflow_window.save_workflow(f"Bind model for {selected_material}")  # Call save_workflow through the WorkflowWindow reference
                 messagebox.showinfo("Model Bound", f"Model '{self.selected_model_name}' has been bound to the workflow for {selected_material}.")
-                self.update_bound_model_label(selected_material)
-                self.re_evaluate_model_button.config(state=tk.NORMAL)
         else:
             messagebox.showwarning("Warning", "No model selected to bind.")
 
@@ -2,19 +2,9 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import json
 import os
-from PIL import Image, ImageDraw
 import source_configuration as sc
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-
-# Placeholder function for the image generation
-def get_placeholder_image():
-    image = Image.new('RGB', (600, 600), 'black')
-    draw = ImageDraw.Draw(image)
-    draw.text((150, 300), "Utopian Automated Laboratory", fill="white")
-    image.save("placeholder_image.png")
-    return "placeholder_image.png"
+import lazy_imports
+from gui_common import pd, get_placeholder_image
 
 class BerthaGUI(tk.Tk):
     def __init__(self):
@@ -29,6 +19,7 @@ class BerthaGUI(tk.Tk):
 
         self.create_widgets()
         self.apply_dark_theme()
+        self.after(100, lazy_imports.warm_up)  # Load pandas once the first frame is up
 
     def create_widgets(self):
         self.placeholder_image = tk.PhotoImage(file=get_placeholder_image())
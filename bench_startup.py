@@ -0,0 +1,58 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Measures how long the GUI takes from interpreter start to the first painted
+# entry window. "eager" reproduces the old behaviour by importing pandas,
+# matplotlib and PIL before the GUI module, "lazy" is the current behaviour.
+# Without a display only the module import time is measured.
+
+PROBE = r"""
+import sys, time
+start = time.perf_counter()
+if sys.argv[1] == "eager":
+    import pandas, matplotlib.pyplot, matplotlib.backends.backend_tkagg, PIL.Image
+import importlib
+gui = importlib.import_module(sys.argv[2])
+imported = time.perf_counter()
+try:
+    app = gui.BerthaGUI()
+except Exception:
+    print(f"{imported - start:.4f} nan")
+else:
+    app.update()
+    print(f"{imported - start:.4f} {time.perf_counter() - start:.4f}")
+    app.destroy()
+"""
+
+
+def measure(mode, module, repeat):
+    import_times, frame_times = [], []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", PROBE, mode, module], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr)
+        import_time, frame_time = result.stdout.split()[-2:]
+        import_times.append(float(import_time))
+        frame_times.append(float(frame_time))
+    return statistics.median(import_times), statistics.median(frame_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GUI start-up time")
+    parser.add_argument("--module", default="GUI", help="GUI module to benchmark (GUI, GUI2 or GUI_1)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'mode':<8}{'import (s)':>12}{'first frame (s)':>18}")
+    for mode in ("eager", "lazy"):
+        import_time, frame_time = measure(mode, args.module, args.repeat)
+        frame = "n/a (no display)" if frame_time != frame_time else f"{frame_time:.3f}"
+        print(f"{mode:<8}{import_time:>12.3f}{frame:>18}")
+
+
+if __name__ == "__main__":
+    main()
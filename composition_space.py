@@ -0,0 +1,127 @@
+import itertools
+from math import comb
+
+import numpy as np
+
+import composition_store
+
+# Sobol direction numbers (Joe & Kuo, new-joe-kuo-6.21201) for dimensions 2 to 5: (degree s,
+# coefficients a, initial m values). Dimension 1 is the van der Corput sequence. Five dimensions
+# cover the simplex of six sources.
+SOBOL_DIRECTIONS = [
+    (1, 0, [1]),
+    (2, 1, [1, 3]),
+    (3, 1, [1, 3, 1]),
+    (3, 2, [1, 1, 1]),
+]
+SOBOL_BITS = 30
+
+
+def simplex_lattice(n_materials, divisions):
+    # Every composition of `divisions` equal parts over n_materials, as an integer matrix.
+    # Stars and bars: each choice of n_materials - 1 bar positions is one composition.
+    if n_materials == 1:
+        return np.array([[divisions]])
+    n_slots = divisions + n_materials - 1
+    count = comb(n_slots, n_materials - 1)
+    bars = np.fromiter(itertools.chain.from_iterable(itertools.combinations(range(n_slots), n_materials - 1)),
+                       dtype=np.int64, count=count * (n_materials - 1)).reshape(count, n_materials - 1)
+    edges = np.empty((count, n_materials + 1), dtype=np.int64)
+    edges[:, 0] = -1
+    edges[:, 1:-1] = bars
+    edges[:, -1] = n_slots
+    return np.diff(edges, axis=1) - 1
+
+
+def cube_to_simplex(points):
+    # Uniform points in the (n - 1)-cube to uniform points on the n-simplex (sorted spacings)
+    points = np.sort(points, axis=1)
+    edges = np.hstack([np.zeros((len(points), 1)), points, np.ones((len(points), 1))])
+    return np.diff(edges, axis=1)
+
+
+def latin_hypercube(n_materials, samples, seed=None):
+    # Fractions (rows sum to 1) from a Latin hypercube over the n - 1 free dimensions
+    rng = np.random.default_rng(seed)
+    dims = n_materials - 1
+    strata = np.argsort(rng.random((samples, dims)), axis=0)  # An independent permutation per dimension
+    points = (strata + rng.random((samples, dims))) / samples
+    return cube_to_simplex(points)
+
+
+def sobol_points(dims, samples):
+    # First `samples` points of the unscrambled Sobol sequence in [0, 1)^dims
+    if dims > len(SOBOL_DIRECTIONS) + 1:
+        raise ValueError(f"Sobol sampling supports at most {len(SOBOL_DIRECTIONS) + 2} materials")
+    directions = np.empty((dims, SOBOL_BITS), dtype=np.int64)
+    directions[0] = 1 << np.arange(SOBOL_BITS - 1, -1, -1)
+    for dim, (s, a, m) in enumerate(SOBOL_DIRECTIONS[:dims - 1], start=1):
+        v = [m[k] << (SOBOL_BITS - 1 - k) for k in range(s)]
+        for k in range(s, SOBOL_BITS):
+            value = v[k - s] ^ (v[k - s] >> s)
+            for j in range(1, s):
+                if (a >> (s - 1 - j)) & 1:
+                    value ^= v[k - j]
+            v.append(value)
+        directions[dim] = v
+
+    # Gray code order: point i is point i - 1 with the direction of i's lowest set bit XORed in
+    index = np.arange(1, samples, dtype=np.int64)
+    lowest_bit = np.frexp((index & -index).astype(float))[1] - 1
+    points = np.zeros((samples, dims), dtype=np.int64)
+    points[1:] = np.bitwise_xor.accumulate(directions[:, lowest_bit].T, axis=0)
+    return points / float(1 << SOBOL_BITS)
+
+
+def sobol(n_materials, samples):
+    # Fractions (rows sum to 1) from a Sobol sequence over the n - 1 free dimensions
+    return cube_to_simplex(sobol_points(n_materials - 1, samples))
+
+
+def quantize(fractions, total):
+    # Whole amounts summing to total per row, by largest remainder
+    scaled = np.asarray(fractions) * total
+    amounts = np.floor(scaled).astype(np.int64)
+    missing = total - amounts.sum(axis=1)
+    order = np.argsort(amounts - scaled, axis=1)  # Largest remainder first
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(order.shape[1])[None, :].repeat(len(order), axis=0), axis=1)
+    return amounts + (ranks < missing[:, None])
+
+
+def apply_constraints(amounts, minimum=None, maximum=None, min_components=2):
+    # Rows whose fractions lie within [minimum, maximum] per material and that use at least
+    # min_components materials. minimum and maximum are per-material sequences (None = no bound).
+    amounts = np.asarray(amounts)
+    totals = amounts.sum(axis=1, keepdims=True)
+    fractions = np.divide(amounts, totals, out=np.zeros(amounts.shape), where=totals > 0)
+    keep = (amounts > 0).sum(axis=1) >= min_components
+    if minimum is not None:
+        keep &= np.all(fractions >= np.asarray(minimum, dtype=float) - 1e-12, axis=1)
+    if maximum is not None:
+        keep &= np.all(fractions <= np.asarray(maximum, dtype=float) + 1e-12, axis=1)
+    return amounts[keep]
+
+
+def candidate_count(method, n_materials, size):
+    # Rows generate() builds before constraints are applied, known without building them
+    if method == "lattice":
+        return comb(size + n_materials - 1, n_materials - 1)
+    return size
+
+
+def generate(materials, method, size, resolution=100, minimum=None, maximum=None, min_components=2, seed=None):
+    # Candidate targets for the given materials as a CompositionStore of whole amounts.
+    # method is "lattice" (size = divisions), "lhs" or "sobol" (size = samples; fractions are
+    # rounded to whole parts of `resolution` and duplicates removed).
+    n = len(materials)
+    if n < 2:
+        raise ValueError("At least two materials are needed")
+    if method == "lattice":
+        amounts = simplex_lattice(n, size)
+    else:
+        fractions = latin_hypercube(n, size, seed) if method == "lhs" else sobol(n, size)
+        amounts = np.unique(quantize(fractions, resolution), axis=0)
+    store = composition_store.CompositionStore(materials, capacity=len(amounts))
+    store.extend(apply_constraints(amounts, minimum, maximum, min_components))
+    return store
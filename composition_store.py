@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+
+class CompositionStore:
+    # Bound target compositions as a rows x materials float matrix. Capacity doubles when it
+    # runs out, so appending n rows one at a time costs O(n) copies overall.
+    def __init__(self, materials, capacity=8):
+        self.materials = list(materials)
+        self._data = np.zeros((max(capacity, 1), len(self.materials)))
+        self._rows = 0
+
+    @classmethod
+    def from_records(cls, materials, records):
+        # records as stored in a workflow file: one {material: amount} dict per target. Older
+        # files hold the amounts as strings; missing materials are 0.
+        store = cls(materials, capacity=len(records))
+        matrix = np.zeros((len(records), len(store.materials)))
+        for row, record in enumerate(records):
+            for col, material in enumerate(store.materials):
+                value = record.get(material, 0)
+                matrix[row, col] = float(value) if value != "" else 0.0
+        store.extend(matrix)
+        return store
+
+    def __len__(self):
+        return self._rows
+
+    @property
+    def values(self):
+        # View of the filled rows; not a copy
+        return self._data[:self._rows]
+
+    def _reserve(self, rows):
+        needed = self._rows + rows
+        if needed <= len(self._data):
+            return
+        capacity = len(self._data)
+        while capacity < needed:
+            capacity *= 2
+        data = np.zeros((capacity, len(self.materials)))
+        data[:self._rows] = self._data[:self._rows]
+        self._data = data
+
+    def append(self, amounts):
+        # amounts in material order, or a {material: amount} dict
+        if isinstance(amounts, dict):
+            amounts = [amounts.get(material, 0) for material in self.materials]
+        self.extend([amounts])
+
+    def extend(self, matrix):
+        matrix = np.asarray(matrix, dtype=float).reshape(-1, len(self.materials))
+        self._reserve(len(matrix))
+        self._data[self._rows:self._rows + len(matrix)] = matrix
+        self._rows += len(matrix)
+
+    def clear(self):
+        self._rows = 0
+
+    def to_dataframe(self):
+        return pd.DataFrame(self.values, columns=self.materials, copy=False)
+
+    def to_records(self):
+        # Whole amounts are written as ints, so files keep the "2 : 1" look of hand-entered targets
+        values = self.values
+        whole = np.all(values == np.round(values), axis=1)
+        records = []
+        for row, is_whole in zip(values.tolist(), whole):
+            if is_whole:
+                row = [int(value) for value in row]
+            records.append(dict(zip(self.materials, row)))
+        return records
@@ -0,0 +1,23 @@
+import local_cache
+import lazy_imports
+
+# Shared by the GUI modules (GUI, GUI2, GUI_1)
+
+# Heavy libraries are imported on first use (or warmed in the background once the entry window is shown)
+pd = lazy_imports.lazy("pandas")
+pil_image = lazy_imports.lazy("PIL.Image")
+
+# Everything that affects the rendered background; changing it invalidates the cached image
+PLACEHOLDER_IMAGE_SPEC = {"size": (600, 600), "background": "black", "text": "Utopian Automated Laboratory", "text_position": (150, 300), "text_colour": "white"}
+
+def render_placeholder_image(path):
+    from PIL import Image, ImageDraw  # Only needed when the cached image is missing or stale
+    spec = PLACEHOLDER_IMAGE_SPEC
+    image = Image.new('RGB', spec["size"], spec["background"])
+    draw = ImageDraw.Draw(image)
+    draw.text(spec["text_position"], spec["text"], fill=spec["text_colour"])
+    image.save(path, format="PNG")
+
+# Placeholder function for the image generation
+def get_placeholder_image():
+    return local_cache.get_asset("placeholder_image.png", PLACEHOLDER_IMAGE_SPEC, render_placeholder_image)
@@ -0,0 +1,48 @@
+import importlib
+import threading
+
+# Modules registered through lazy(); warm_up() imports them in the background. Modules that are
+# not safe to import off the Tk thread (e.g. matplotlib's pyplot) are registered with warm=False.
+_registered = []
+
+
+class LazyModule:
+    # Stands in for a module and imports it on first attribute access
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy(name, warm=True):
+    # warm=False keeps a module out of the background warm-up (e.g. modules with side effects)
+    module = LazyModule(name)
+    if warm:
+        _registered.append(module)
+    return module
+
+
+def warm_up():
+    # Import every registered module on a daemon thread so the first window that
+    # needs them does not pay the import cost
+    def load_all():
+        for module in _registered:
+            try:
+                module._load()
+            except ImportError as e:
+                print(f"Background import of {module._name} failed: {e}")
+
+    thread = threading.Thread(target=load_all, name="lazy-import-warm-up", daemon=True)
+    thread.start()
+    return thread
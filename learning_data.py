@@ -0,0 +1,196 @@
+import concurrent.futures
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+import local_cache
+
+# Learning data of SDL runs (learning_data.csv in each report folder). Reading is mostly waiting on
+# the reports share, so several files are read at once in a thread pool; the Tk thread polls the
+# load for progress and collects one combined frame when every file has been read.
+#
+# Each file is parsed from text only once: its columns are then kept as .npy files in the user
+# cache, one directory per file keyed by path, size and mtime, and later reads load them as plain
+# binary arrays. They are read into memory rather than memory-mapped, so a cached frame is as
+# writable as a parsed one and no files stay open (on Windows that would block eviction).
+# A directory's mtime records when it was last used; the least recently used ones are removed
+# when the cache grows past CACHE_MAX_BYTES.
+
+LEARNING_DATA = "learning_data.csv"
+MAX_WORKERS = 8
+CACHE_VERSION = 1
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+COLUMNS_FILE = "columns.json"
+
+_evict_lock = threading.Lock()
+
+
+def columns_cache_dir():
+    directory = local_cache.cache_dir()
+    if not directory:
+        return None
+    directory = os.path.join(directory, "learning_data")
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        return None
+    return directory
+
+
+def fingerprint(csv_path):
+    stat = os.stat(csv_path)
+    key = f"{CACHE_VERSION}|{os.path.abspath(csv_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def load_cached(entry):
+    meta = local_cache.read_json(os.path.join(entry, COLUMNS_FILE), None)
+    if meta is None:
+        return None
+    try:
+        columns = {name: np.load(os.path.join(entry, f"{i}.npy"), allow_pickle=False)
+                   for i, name in enumerate(meta["columns"])}
+    except (OSError, ValueError, KeyError):
+        return None
+    try:
+        os.utime(entry)  # Most recently used
+    except OSError:
+        pass
+    return pd.DataFrame(columns)
+
+
+def store_cached(directory, key, frame):
+    if frame.empty:
+        return
+    arrays = []
+    for name in frame.columns:
+        column = frame[name]
+        if column.dtype.kind in "biuf":
+            arrays.append(column.to_numpy())
+        elif pd.api.types.infer_dtype(column, skipna=False) == "string":
+            arrays.append(column.to_numpy(dtype=str))
+        else:
+            return  # Missing or mixed text values do not round-trip through .npy; parse this file each time
+
+    entry = os.path.join(directory, key)
+    tmp = None
+    try:
+        tmp = tempfile.mkdtemp(dir=directory, suffix=".tmp")
+        for i, array in enumerate(arrays):
+            np.save(os.path.join(tmp, f"{i}.npy"), array, allow_pickle=False)
+        local_cache.atomic_write_json(os.path.join(tmp, COLUMNS_FILE), {"columns": [str(name) for name in frame.columns]})
+        if os.path.isdir(entry):
+            remove_entry(entry)  # Left incomplete by an eviction that could not finish
+        os.rename(tmp, entry)
+    except OSError:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+        return
+    evict(directory, CACHE_MAX_BYTES)
+
+
+def remove_entry(entry):
+    # Drop the column list first so a partly removed entry (a file still open elsewhere) is a miss
+    try:
+        os.remove(os.path.join(entry, COLUMNS_FILE))
+    except OSError:
+        pass
+    shutil.rmtree(entry, ignore_errors=True)
+
+
+def directory_size(path):
+    with os.scandir(path) as scanned:
+        return sum(file.stat().st_size for file in scanned)
+
+
+def evict(directory, max_bytes):
+    # Remove the least recently used entries until the cache fits in max_bytes
+    with _evict_lock:
+        entries = []
+        try:
+            with os.scandir(directory) as scanned:
+                for entry in scanned:
+                    if entry.is_dir():
+                        entries.append((entry.stat().st_mtime, directory_size(entry.path), entry.path))
+        except OSError:
+            return
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            remove_entry(path)
+            total -= size
+
+
+def read_learning_data(folder):
+    csv_path = os.path.join(folder, LEARNING_DATA)
+    directory = columns_cache_dir()
+    if directory is None:
+        return pd.read_csv(csv_path)
+    key = fingerprint(csv_path)
+    frame = load_cached(os.path.join(directory, key))
+    if frame is None:
+        frame = pd.read_csv(csv_path)
+        store_cached(directory, key, frame)
+    return frame
+
+
+class LearningDataLoad:
+    def __init__(self, folders, columns=None, max_workers=MAX_WORKERS):
+        self.folders = list(folders)
+        self.columns = columns  # Header the files must have (that of data already loaded), or None
+        self.lock = threading.Lock()
+        self.done = 0
+        self.frames = {}
+        self.errors = {}
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(self.folders))))
+        for folder in self.folders:
+            executor.submit(self._load, folder)
+        executor.shutdown(wait=False)
+
+    def _load(self, folder):
+        try:
+            frame = read_learning_data(folder)
+        except Exception as e:
+            with self.lock:
+                self.errors[folder] = f"Error reading learning data file: {e}"
+                self.done += 1
+            return
+        with self.lock:
+            self.frames[folder] = frame
+            self.done += 1
+
+    @property
+    def total(self):
+        return len(self.folders)
+
+    @property
+    def finished(self):
+        with self.lock:
+            return self.done == len(self.folders)
+
+    def result(self):
+        # (combined frame or None, folders added, error messages), in selection order; files whose
+        # header differs from the expected one (or from the first file read) are left out
+        frames, loaded, errors = [], [], []
+        columns = self.columns
+        for folder in self.folders:
+            if folder in self.errors:
+                errors.append(f"{folder}: {self.errors[folder]}")
+                continue
+            frame = self.frames[folder]
+            if columns is None:
+                columns = frame.columns
+            elif not frame.columns.equals(columns):
+                errors.append(f"{folder}: headers of the learning data files do not match.")
+                continue
+            frame['folder_path'] = folder  # Add folder path to the DataFrame for later reference
+            frames.append(frame)
+            loaded.append(folder)
+        combined = pd.concat(frames, ignore_index=True) if frames else None
+        return combined, loaded, errors
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import tempfile
+
+# Directory holding the files that ship with the GUI (placeholder image etc.)
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_NAME = "asset_manifest.json"
+
+
+def cache_dir():
+    # Per-user cache directory, used when the application directory is read-only
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    for directory in (os.path.join(base, "bertha_gui"), os.path.join(tempfile.gettempdir(), "bertha_gui")):
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError:
+            continue
+        if os.access(directory, os.W_OK):
+            return directory
+    return None
+
+
+def content_key(spec):
+    # Stable hash of everything that influences how an asset is rendered
+    encoded = json.dumps(spec, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def read_json(path, default):
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return default
+
+
+def atomic_write_json(path, data):
+    # Write to a temporary file next to the target and rename it into place
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as file:
+            json.dump(data, file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _cached_asset(directory, filename, key):
+    path = os.path.join(directory, filename)
+    manifest = read_json(os.path.join(directory, MANIFEST_NAME), {})
+    if manifest.get(filename) == key and os.path.isfile(path):
+        return path
+    return None
+
+
+def get_asset(filename, spec, render):
+    # Return the path of a cached asset, rendering it only when the cached copy
+    # is missing or was produced from a different spec
+    key = content_key(spec)
+    directories = [APP_DIR]
+    user_dir = cache_dir()
+    if user_dir:
+        directories.append(user_dir)
+
+    for directory in directories:
+        path = _cached_asset(directory, filename, key)
+        if path:
+            return path
+
+    for directory in directories:
+        if not os.access(directory, os.W_OK):
+            continue
+        path = os.path.join(directory, filename)
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=os.path.splitext(filename)[1])
+            os.close(fd)
+            render(tmp_path)
+            os.replace(tmp_path, path)
+            manifest_path = os.path.join(directory, MANIFEST_NAME)
+            manifest = read_json(manifest_path, {})
+            manifest[filename] = key
+            atomic_write_json(manifest_path, manifest)
+        except OSError:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            continue
+        return path
+
+    raise OSError(f"No writable location to cache {filename}")
@@ -0,0 +1,138 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+import learning_data
+import run_index
+
+# Rate model per source, consistent with recipe_simulation: deposition rate = rate_per_watt * power,
+# and a powered source must run at or above its learned minimum power. A target composition fixes
+# the ratio of the source rates; the solver picks the overall rate.
+POWER_COLUMN = re.compile(r"power", re.IGNORECASE)
+RATE_COLUMN = re.compile(r"rate", re.IGNORECASE)
+DEFAULT_UTILISATION = 0.9  # Fraction of the fastest feasible rate used when no total rate is given
+
+
+class PowerPlan:
+    def __init__(self, materials, powers, total_rates, feasible, margins, reasons):
+        self.materials = materials
+        self.powers = powers  # targets x sources (W); unused sources are 0
+        self.total_rates = total_rates  # Per target combined deposition rate (nm/s)
+        self.feasible = feasible  # Per target bool
+        self.margins = margins  # targets x sources headroom to max_powers (W); inf for unused sources
+        self.reasons = reasons  # Per target "" or why it is infeasible
+
+    def summary(self):
+        count = len(self.feasible)
+        lines = [f"{int(self.feasible.sum())} of {count} targets are feasible"]
+        if self.feasible.any():
+            lines.append(f"Smallest margin to max power: {self.margins[self.feasible].min():.1f} W")
+        return "\n".join(lines)
+
+
+def solve_powers(compositions, source_indices, min_powers, rates_per_watt, max_powers, total_rate=None, utilisation=DEFAULT_UTILISATION, materials=None):
+    # compositions: targets x k amounts for the sources in source_indices. min_powers,
+    # rates_per_watt and max_powers are per source (NaN where no model is bound). Every target is
+    # solved at once; returns a PowerPlan over all sources.
+    compositions = np.asarray(compositions, dtype=float).reshape(-1, len(source_indices))
+    source_indices = np.asarray(source_indices, dtype=int)
+    n_targets, n_sources = len(compositions), len(max_powers)
+    low = np.asarray(min_powers, dtype=float)[source_indices]
+    rate = np.asarray(rates_per_watt, dtype=float)[source_indices]
+    high = np.asarray([float(p) for p in max_powers])[source_indices]
+
+    totals = compositions.sum(axis=1)
+    fractions = np.divide(compositions, totals[:, None], out=np.zeros_like(compositions), where=totals[:, None] > 0)
+    used = fractions > 0
+    missing_model = (used & (np.isnan(low) | np.isnan(rate) | (rate <= 0))).any(axis=1)
+
+    # Source i delivers fraction f_i of the total rate R at power R * f_i / rate_i, so
+    # low_i <= R * f_i / rate_i <= high_i bounds R from both sides
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slowest = np.where(used, low * rate / fractions, 0.0).max(axis=1, initial=0.0)
+        fastest = np.where(used, high * rate / fractions, np.inf).min(axis=1, initial=np.inf)
+    if total_rate is None:
+        chosen = np.maximum(utilisation * fastest, slowest)
+    else:
+        chosen = np.full(n_targets, float(total_rate))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        active_powers = np.where(used, chosen[:, None] * fractions / rate, 0.0)
+    feasible = (totals > 0) & ~missing_model & (slowest <= fastest) & (chosen >= slowest) & (chosen <= fastest)
+
+    reasons = np.full(n_targets, "", dtype=object)
+    reasons[chosen > fastest] = "needs more than max power"
+    reasons[chosen < slowest] = "needs less than minimum power"
+    reasons[slowest > fastest] = "ratio outside the sources' power range"
+    reasons[missing_model] = "no rate model bound for a material"
+    reasons[totals <= 0] = "empty composition"
+
+    powers = np.zeros((n_targets, n_sources))
+    margins = np.full((n_targets, n_sources), np.inf)
+    powers[:, source_indices] = np.where(np.isfinite(active_powers), active_powers, 0.0)
+    margins[:, source_indices] = np.where(used, high - powers[:, source_indices], np.inf)
+    return PowerPlan(materials, powers, np.where(np.isfinite(chosen), chosen, 0.0), feasible, margins, reasons)
+
+
+def _columns(data):
+    power = next((c for c in data.columns if POWER_COLUMN.search(str(c))), None)
+    rate = next((c for c in data.columns if RATE_COLUMN.search(str(c))), None)
+    return power, rate
+
+
+def minimum_power(data):
+    # Lowest power in EE_LearnMinimumRate learning data that still gave a deposition rate
+    power, rate = _columns(data)
+    if power is None:
+        return np.nan
+    powers = pd.to_numeric(data[power], errors="coerce")
+    if rate is not None:
+        powers = powers[pd.to_numeric(data[rate], errors="coerce") > 0]
+    return float(powers.min()) if powers.notna().any() else np.nan
+
+
+def rate_per_watt(data):
+    # Least-squares slope through the origin of rate against power in SJ_LearnSputterProcess data
+    power, rate = _columns(data)
+    if power is None or rate is None:
+        return np.nan
+    points = pd.DataFrame({"p": pd.to_numeric(data[power], errors="coerce"), "r": pd.to_numeric(data[rate], errors="coerce")}).dropna()
+    denominator = float((points["p"] ** 2).sum())
+    return float((points["p"] * points["r"]).sum()) / denominator if denominator else np.nan
+
+
+def find_report_folder(reports_dir, model_name, process, source_number):
+    # Bound model names are the first characters of their SDL report folder
+    index = run_index.shared(reports_dir)
+    index.refresh()
+    run = index.find(model_name, process, (source_number,))
+    return index.path(run) if run else None
+
+
+def load_rate_models(workflow_data, materials, reports_dir):
+    # Per source (min_powers, rates_per_watt) from the models bound in the workflow; NaN when a
+    # model is not bound or its learning data cannot be read. Targets using a source without
+    # both models are reported as having no rate model bound.
+    min_powers = np.full(len(materials), np.nan)
+    rates = np.full(len(materials), np.nan)
+    for i, material in enumerate(materials):
+        for process, target in (("EE_LearnMinimumRate", min_powers), ("SJ_LearnSputterProcess", rates)):
+            model_name = workflow_data.get(f"{process}_model_{material}")
+            folder = find_report_folder(reports_dir, model_name, process, i + 1) if model_name else None
+            if folder is None:
+                continue
+            try:
+                data = learning_data.read_learning_data(folder)
+            except (OSError, ValueError):
+                continue
+            target[i] = minimum_power(data) if target is min_powers else rate_per_watt(data)
+    return min_powers, rates
+
+
+def plan_workflow(workflow_data, compositions, materials, max_powers, reports_dir, total_rate=None):
+    # Powers for every bound target of a workflow. compositions is a CompositionStore whose
+    # columns are material names of the workflow's active sources.
+    source_indices = [list(materials).index(material) for material in compositions.materials]
+    min_powers, rates = load_rate_models(workflow_data, materials, reports_dir)
+    return solve_powers(compositions.values, source_indices, min_powers, rates, max_powers, total_rate, materials=list(materials))
@@ -0,0 +1,234 @@
+import hashlib
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+
+import local_cache
+
+INDEX_VERSION = 2
+
+# Recipe columns belong to a source when their header names it, e.g. "Source 1 power" or "S1_power",
+# or names the material loaded in it (sc.materials), e.g. "Zr" or "CuS power"
+SOURCE_HEADER = re.compile(r"\b(?:source|src|s)[\s_]*([1-6])(?!\d)", re.IGNORECASE)
+HEADER_WORDS = re.compile(r"[^\s_\-()/\[\]]+")
+
+
+def header_source(header, materials=()):
+    # Source index (0-5) a column header refers to, or None
+    match = SOURCE_HEADER.search(header)
+    if match:
+        return int(match.group(1)) - 1
+    for word in HEADER_WORDS.findall(header):
+        if word in materials:  # Whole words, so "SnS" is not taken for "Sn"
+            return list(materials).index(word)
+    return None
+
+
+def source_columns(headers, materials=()):
+    # Map source index (0-5) to the recipe column that drives it, preferring columns named "power"
+    columns = {}
+    for header in headers:
+        index = header_source(header, materials)
+        if index is None:
+            continue
+        if index not in columns or ("power" in header.lower() and "power" not in columns[index].lower()):
+            columns[index] = header
+    return columns
+
+
+def duration_column(headers, materials=()):
+    # The step duration column: first header mentioning time or duration that is not a source column
+    for header in headers:
+        lowered = header.lower()
+        if ("time" in lowered or "duration" in lowered) and header_source(header, materials) is None:
+            return header
+    return None
+
+
+def _is_nonzero(value):
+    try:
+        return float(value) != 0
+    except ValueError:
+        return False
+
+
+def scan_recipe(path, materials=()):
+    # Read the header and work out which sources are powered at some step, streaming line by line
+    with open(path, 'r') as file:
+        headers = file.readline().rstrip("\r\n").split("\t")
+        columns = source_columns(headers, materials)
+        positions = {index: headers.index(header) for index, header in columns.items()}
+        active_sources = [False] * 6
+        for line in file:
+            if not positions:
+                break
+            values = line.rstrip("\r\n").split("\t")
+            for index, position in list(positions.items()):
+                if position < len(values) and _is_nonzero(values[position]):
+                    active_sources[index] = True
+                    del positions[index]  # No need to look at this column again
+    return headers, active_sources
+
+
+class RecipeLibrary:
+    # Index of the recipe folder, persisted between sessions and refreshed from file mtimes
+    def __init__(self, recipe_dir, index_path=None, materials=()):
+        self.recipe_dir = recipe_dir
+        self.materials = list(materials)  # Source materials, for recipes with material-named columns
+        if index_path is None:
+            directory = local_cache.cache_dir()
+            if directory:
+                digest = hashlib.sha1(os.path.abspath(recipe_dir).encode("utf-8")).hexdigest()[:12]
+                index_path = os.path.join(directory, f"recipe_index_{digest}.json")
+        self.index_path = index_path
+        self.entries = {}  # recipe name -> {"name", "size", "mtime", "headers", "active_sources"}
+        self.load_index()
+
+    def load_index(self):
+        if not self.index_path:
+            return
+        data = local_cache.read_json(self.index_path, {})
+        if data.get("version") == INDEX_VERSION and data.get("recipe_dir") == self.recipe_dir and data.get("materials") == self.materials:
+            self.entries = {entry["name"]: entry for entry in data.get("entries", [])}
+
+    def save_index(self):
+        if not self.index_path:
+            return
+        data = {"version": INDEX_VERSION, "recipe_dir": self.recipe_dir, "materials": self.materials, "entries": list(self.entries.values())}
+        try:
+            local_cache.atomic_write_json(self.index_path, data)
+        except OSError as e:
+            print(f"Could not save recipe index: {e}")
+
+    def refresh(self):
+        # List the folder once and only read recipes that are new or whose size/mtime changed
+        try:
+            with os.scandir(self.recipe_dir) as scanned:
+                listing = [entry for entry in scanned if entry.name.endswith('.txt') and entry.is_file()]
+        except OSError:
+            return False  # Folder unavailable (e.g. share offline); keep the last known index
+
+        changed = False
+        entries = {}
+        for dir_entry in listing:
+            stat = dir_entry.stat()
+            known = self.entries.get(dir_entry.name)
+            if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime:
+                entries[dir_entry.name] = known
+                continue
+            try:
+                headers, active_sources = scan_recipe(dir_entry.path, self.materials)
+            except (OSError, UnicodeDecodeError):
+                continue
+            entries[dir_entry.name] = {"name": dir_entry.name, "size": stat.st_size, "mtime": stat.st_mtime,
+                                       "headers": headers, "active_sources": active_sources}
+            changed = True
+
+        if changed or entries.keys() != self.entries.keys():
+            self.entries = entries
+            self.save_index()
+            return True
+        return False
+
+    def names(self, required_sources=None):
+        # Recipe names, optionally only those using every source flagged True in required_sources
+        names = []
+        for name, entry in self.entries.items():
+            if required_sources and not all(entry["active_sources"][i] for i, required in enumerate(required_sources) if required):
+                continue
+            names.append(name)
+        return sorted(names)
+
+    def entry(self, name):
+        return self.entries.get(name)
+
+
+class LineIndex:
+    # Byte offset of every line of a text file, built a chunk at a time so the GUI can
+    # interleave indexing with painting; any line can then be read with a single seek
+    def __init__(self, path, chunk_size=1 << 20):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.offsets = array('q', [0])
+        self.done = False
+        self._file = open(path, 'rb')
+
+    def build_step(self):
+        # Index the next chunk; returns True once the whole file has been indexed
+        if self.done:
+            return True
+        base = self._file.tell()
+        chunk = self._file.read(self.chunk_size)
+        if not chunk:
+            self._file.close()
+            self.done = True
+            if self.offsets[-1] == base and len(self.offsets) > 1:
+                self.offsets.pop()  # A trailing newline does not start another line
+            return True
+        position = chunk.find(b"\n")
+        while position != -1:
+            self.offsets.append(base + position + 1)
+            position = chunk.find(b"\n", position + 1)
+        return False
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    @property
+    def line_count(self):
+        # Lines indexed so far (the last offset may still be a partial line while building)
+        return len(self.offsets) if self.done else len(self.offsets) - 1
+
+    def read_lines(self, start, count):
+        stop = min(start + count, self.line_count)
+        if start >= stop:
+            return []
+        with open(self.path, 'rb') as file:
+            file.seek(self.offsets[start])
+            lines = [file.readline() for _ in range(stop - start)]
+        return [line.decode("utf-8", errors="replace").rstrip("\r\n") for line in lines]
+
+
+class RecipeCache:
+    # Bounded LRU of parsed recipes keyed by (path, mtime, size), shared by everything that
+    # needs the parsed recipe so a recipe is only parsed again when the file changes.
+    # Cached results are shared, so callers must not modify the returned DataFrame.
+    def __init__(self, loader, max_entries=16):
+        self.loader = loader
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()  # Recipes are also parsed from run worker threads
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        result = self.loader(path)
+
+        with self._lock:
+            for stale in [k for k in self._entries if k[0] == path]:
+                del self._entries[stale]  # Older versions of the same file can never be hit again
+            self._entries[key] = result
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
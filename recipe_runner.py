@@ -0,0 +1,125 @@
+import queue
+import threading
+
+
+class RunCancelled(Exception):
+    pass
+
+
+class RunControl:
+    # Handed to a job on the worker thread: reports progress and honours pause/cancel. Once a job
+    # hands over to a call that cannot be interrupted (a controller series), pause and cancel no
+    # longer take effect and interruptible is False.
+    def __init__(self, events):
+        self.events = events
+        self.interruptible = True
+        self._cancelled = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+
+    def report(self, progress, message):
+        self.events.put(("progress", progress, message))
+
+    def checkpoint(self):
+        # Call between units of work; blocks while paused and raises RunCancelled once cancelled
+        self._resumed.wait()
+        if self._cancelled.is_set():
+            raise RunCancelled()
+
+    def hand_over(self, message, expected_seconds=None):
+        # Last checkpoint before an uninterruptible call; expected_seconds (or None when unknown)
+        # lets the GUI show elapsed against expected time while the call runs
+        self.checkpoint()
+        self.interruptible = False
+        self.events.put(("handed_over", expected_seconds, message))
+
+    @property
+    def paused(self):
+        return not self._resumed.is_set()
+
+    def pause(self):
+        self._resumed.clear()
+        self.events.put(("status", None, "Paused"))
+
+    def resume(self):
+        self._resumed.set()
+        self.events.put(("status", None, "Resumed"))
+
+    def cancel(self):
+        self._cancelled.set()
+        self._resumed.set()  # Wake a paused job so it can stop
+
+
+class RecipeRunner:
+    # Runs one job at a time on a worker thread. Events are (kind, value, message) tuples
+    # put on a thread-safe queue; the Tk loop collects them with drain() from an after() callback.
+    # kind is "progress", "status", "handed_over" (value = expected seconds or None), "done"
+    # (value = job result), "cancelled" or "error".
+    def __init__(self):
+        self.events = queue.Queue()
+        self.thread = None
+        self.control = None
+        self.job = None  # Function of the current or last job
+        self._active = False
+
+    @property
+    def running(self):
+        # False once the job has returned, so a scheduler can start the next job from the final event
+        return self._active
+
+    def has_pending_events(self):
+        # True until the worker has exited and every event has been drained
+        return (self.thread is not None and self.thread.is_alive()) or not self.events.empty()
+
+    def start(self, job, *args):
+        if self.running:
+            raise RuntimeError("A run is already in progress")
+        self.control = RunControl(self.events)
+        self.job = job
+        # Not a daemon thread: closing the GUI must not kill a deposition half way through
+        self.thread = threading.Thread(target=self._run, args=(job, self.control, args), name="recipe-run")
+        self._active = True
+        self.events.put(("status", None, "Started"))
+        self.thread.start()
+
+    def _run(self, job, control, args):
+        try:
+            result = job(control, *args)
+        except RunCancelled:
+            event = ("cancelled", None, "Cancelled")
+        except Exception as e:
+            event = ("error", None, str(e))
+        else:
+            event = ("done", result, "Finished")
+        self._active = False
+        self.events.put(event)
+
+    def pause(self):
+        if self.running:
+            self.control.pause()
+
+    def resume(self):
+        if self.running:
+            self.control.resume()
+
+    def cancel(self):
+        if self.running:
+            self.control.cancel()
+
+    def drain(self):
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+
+def run_series(control, initialise_series, active_sources, recipe, settings, expected_seconds=None):
+    # The whole series is one controller call (presputtering and QCM setup happen once). It cannot
+    # be paused or cancelled once started, so the GUI offers neither for this job.
+    iterations = settings["iterations"]
+    control.hand_over(f"Running {iterations} iterations on the controller", expected_seconds)
+    initialise_series(active_sources, recipe, settings["use_qcms"], settings["min_qcm"], iterations, settings["presputter_time"])
+    control.report(1.0, f"Completed {iterations} iterations")
+    return iterations
@@ -0,0 +1,76 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+import recipe_library
+
+# Deposition rate per watt for each source (nm/s/W) until calibrated rates are passed in
+DEFAULT_RATE_PER_WATT = 0.01
+
+
+class SimulationResult:
+    def __init__(self, materials, step_thickness, thickness, run_time, qcm_exposure, iterations, compute_time):
+        self.materials = materials
+        self.step_thickness = step_thickness  # steps x sources cumulative thickness within one iteration (nm)
+        self.thickness = thickness  # Per source thickness over all iterations (nm)
+        self.run_time = run_time  # Total seconds including presputter, all iterations
+        self.qcm_exposure = qcm_exposure  # Per source seconds the QCM is exposed, all iterations
+        self.iterations = iterations
+        self.compute_time = compute_time
+
+    @property
+    def speedup(self):
+        return self.run_time / self.compute_time if self.compute_time else float("inf")
+
+    def summary(self):
+        lines = [f"Run time: {self.run_time:.0f} s over {self.iterations} iterations (simulated {self.speedup:,.0f}x faster than real time)"]
+        for i in np.flatnonzero((self.thickness > 0) | (self.qcm_exposure > 0)):
+            lines.append(f"Source {i + 1} ({self.materials[i]}): {self.thickness[i]:.1f} nm, QCM exposed {self.qcm_exposure[i]:.0f} s")
+        return "\n".join(lines)
+
+
+def simulate_recipe(recipe, active_sources, materials, presputter_time, iterations, use_qcms, min_qcm, rates=None):
+    # Predict deposited thickness, run time and QCM exposure without the controller. Every iteration
+    # runs the same steps, so one pass over the step matrix covers all iterations.
+    started = time.perf_counter()
+    n_sources = len(materials)
+    rates = np.full(n_sources, DEFAULT_RATE_PER_WATT) if rates is None else np.asarray(rates, dtype=float)
+    active = np.zeros(n_sources, dtype=bool)
+    active[:len(active_sources)] = np.asarray(active_sources, dtype=bool)[:n_sources]
+
+    headers = [str(c) for c in recipe.columns]
+    duration = recipe_library.duration_column(headers, materials)
+    if duration is None:
+        raise ValueError("Recipe has no step time column")
+    durations = pd.to_numeric(recipe[duration], errors="coerce").fillna(0).to_numpy(dtype=float)
+
+    powers = np.zeros((len(recipe), n_sources))
+    for index, column in recipe_library.source_columns(headers, materials).items():
+        if index < n_sources:
+            powers[:, index] = pd.to_numeric(recipe[column], errors="coerce").fillna(0).to_numpy(dtype=float)
+    powers = np.clip(powers, 0, None) * active
+
+    # Shutters stay closed during presputter, so it adds time but no thickness
+    step_thickness = np.cumsum(powers * rates * durations[:, None], axis=0)
+    thickness = (step_thickness[-1] if len(recipe) else np.zeros(n_sources)) * iterations
+    run_time = (presputter_time + durations.sum()) * iterations
+
+    if use_qcms:
+        powered_time = (powers > 0).T @ durations  # Seconds each source is on during the steps
+        exposure = presputter_time * active + (0 if min_qcm else powered_time)
+        qcm_exposure = exposure * iterations
+    else:
+        qcm_exposure = np.zeros(n_sources)
+
+    return SimulationResult(list(materials), step_thickness, thickness, float(run_time), qcm_exposure, iterations,
+                            time.perf_counter() - started)
+
+
+def simulation_job(control, recipe, active_sources, materials, settings):
+    # RecipeRunner job used when "Simulate" is ticked
+    control.checkpoint()
+    result = simulate_recipe(recipe, active_sources, materials, settings["presputter_time"], settings["iterations"],
+                             settings["use_qcms"], settings["min_qcm"])
+    control.report(1.0, f"Simulated {result.run_time:.0f} s run")
+    return result
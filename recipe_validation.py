@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+import recipe_library
+
+PRESPUTTER_TIME_RANGE = (0, 300)  # seconds
+
+# Per-step checks, in the order they are reported
+STEP_CHECKS = {
+    "non_numeric_power": "power is not a number",
+    "negative_power": "negative power",
+    "over_max_power": "power above max_powers",
+    "inactive_source": "source is not active",
+    "no_material": "source has no material",
+}
+
+
+class ValidationReport:
+    def __init__(self, steps, failures, run_errors, warnings=()):
+        self.steps = steps  # One row per recipe step: a bool column per check and "ok"
+        self.failures = failures  # check name -> steps x sources bool matrix
+        self.run_errors = run_errors  # Problems with the run settings rather than a single step
+        self.warnings = list(warnings)  # What could not be checked; shown, but the run may go ahead
+
+    @property
+    def ok(self):
+        return not self.run_errors and bool(self.steps["ok"].all())
+
+    @property
+    def failed_steps(self):
+        return self.steps[~self.steps["ok"]]
+
+    def step_errors(self, step):
+        # Messages are only built for the steps that are actually shown
+        messages = []
+        for name, description in STEP_CHECKS.items():
+            sources = np.flatnonzero(self.failures[name][step]) + 1
+            if len(sources):
+                messages.append(f"{description} (source {', '.join(map(str, sources))})")
+        return "; ".join(messages)
+
+    def summary(self, max_steps=10):
+        lines = list(self.run_errors)
+        failed = self.failed_steps
+        for step in failed.index[:max_steps]:
+            lines.append(f"Step {step + 1}: {self.step_errors(step)}")
+        if len(failed) > max_steps:
+            lines.append(f"... and {len(failed) - max_steps} more steps")
+        return "\n".join(lines) if lines else "Recipe is valid."
+
+
+def _parse_int(value, name, low, high, run_errors):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        run_errors.append(f"{name} must be a whole number, got {value!r}")
+        return None
+    if not low <= number <= high:
+        run_errors.append(f"{name} must be between {low} and {high}, got {number}")
+    return number
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def validate_recipe(recipe, active_sources, max_powers, materials, presputter_time, iterations, max_iterations):
+    # Check every step of a parsed recipe at once against the source configuration
+    run_errors = []
+    _parse_int(presputter_time, "Presputter time", *PRESPUTTER_TIME_RANGE, run_errors)
+    _parse_int(iterations, "Iterations", 1, max_iterations, run_errors)
+
+    n_sources = len(max_powers)
+    active = np.zeros(n_sources, dtype=bool)
+    active[:len(active_sources)] = np.asarray(active_sources, dtype=bool)[:n_sources]
+
+    limits = np.array([_to_float(p) for p in max_powers])
+    for i in np.flatnonzero(np.isnan(limits)):
+        run_errors.append(f"max_powers for source {i + 1} is not a number ({max_powers[i]!r})")
+    limits[np.isnan(limits)] = np.inf
+
+    has_material = np.array([bool(str(m).strip()) if m is not None else False for m in materials])
+    for i in np.flatnonzero(active & ~has_material):
+        run_errors.append(f"Source {i + 1} is active but has no material")
+
+    # Power columns are found from their headers (source numbers or sc.materials names). A recipe
+    # whose columns cannot be matched is still run, its powers just cannot be checked here.
+    warnings = []
+    columns = recipe_library.source_columns([str(c) for c in recipe.columns], materials)
+    if not columns:
+        warnings.append("No source power columns recognised in the recipe headers; powers were not checked")
+    else:
+        for i in np.flatnonzero(active):
+            if i not in columns:
+                warnings.append(f"No power column found for active source {i + 1} ({materials[i]}); its powers were not checked")
+
+    # steps x sources matrix of powers; sources without a column are never powered
+    powers = np.zeros((len(recipe), n_sources))
+    mapped = np.zeros(n_sources, dtype=bool)
+    for index, column in columns.items():
+        if index < n_sources:
+            powers[:, index] = pd.to_numeric(recipe[column], errors="coerce").to_numpy(dtype=float)
+            mapped[index] = True
+
+    non_numeric = np.isnan(powers) & mapped
+    powers = np.where(non_numeric, 0.0, powers)
+    used = powers > 0
+
+    failures = {
+        "non_numeric_power": non_numeric,
+        "negative_power": powers < 0,
+        "over_max_power": powers > limits,
+        "inactive_source": used & ~active,
+        "no_material": used & ~has_material,
+    }
+
+    steps = pd.DataFrame({name: mask.any(axis=1) for name, mask in failures.items()})
+    steps["ok"] = ~steps[list(STEP_CHECKS)].any(axis=1)
+    return ValidationReport(steps, failures, run_errors, warnings)
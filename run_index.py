@@ -0,0 +1,145 @@
+import hashlib
+import os
+import re
+import time
+
+import local_cache
+
+# Index of the self-driving lab's report folders. Folder names carry a timestamp prefix (its
+# first TIMESTAMP_LENGTH characters, which the GUI uses as the model name), the experiment
+# type and the sources used, e.g. "...EE_LearnMinimumRate...([3])". Each folder is parsed once
+# and kept in an index in the user cache; a refresh only rescans the folder list when the
+# reports directory changed and otherwise re-checks recent runs still waiting for learning data.
+
+INDEX_VERSION = 1
+TIMESTAMP_LENGTH = 9
+EXPERIMENT = re.compile(r"[A-Z]{2}_[A-Za-z]+")
+SOURCES = re.compile(r"\(\[([\d,\s]*)\]\)")
+LEARNING_DATA = "learning_data.csv"
+ACTIVE_SECONDS = 24 * 3600  # Runs without learning data older than this are treated as finished
+
+
+def parse_run(name):
+    experiment = EXPERIMENT.search(name)
+    sources = SOURCES.search(name)
+    return {
+        "name": name,
+        "timestamp": name[:TIMESTAMP_LENGTH],
+        "experiment": experiment.group(0) if experiment else None,
+        "sources": [int(s) for s in re.findall(r"\d+", sources.group(1))] if sources else [],
+    }
+
+
+class RunIndex:
+    def __init__(self, reports_dir, index_path=None):
+        self.reports_dir = reports_dir
+        if index_path is None:
+            directory = local_cache.cache_dir()
+            if directory:
+                digest = hashlib.sha1(os.path.abspath(reports_dir).encode("utf-8")).hexdigest()[:12]
+                index_path = os.path.join(directory, f"run_index_{digest}.json")
+        self.index_path = index_path
+        self.loaded = False
+        self.dir_mtime = None
+        self.runs = {}  # Folder name -> parsed run
+        self.by_key = {}  # (experiment, sources) -> runs, sorted by name
+
+    def load_index(self):
+        self.loaded = True
+        if not self.index_path:
+            return
+        data = local_cache.read_json(self.index_path, {})
+        if data.get("version") == INDEX_VERSION and data.get("reports_dir") == self.reports_dir:
+            self.dir_mtime = data.get("dir_mtime")
+            self.runs = {run["name"]: run for run in data.get("runs", [])}
+            self.rebuild_queries()
+
+    def save_index(self):
+        if not self.index_path:
+            return
+        try:
+            local_cache.atomic_write_json(self.index_path, {"version": INDEX_VERSION, "reports_dir": self.reports_dir,
+                                                            "dir_mtime": self.dir_mtime, "runs": list(self.runs.values())})
+        except OSError as e:
+            print(f"Could not save run index: {e}")
+
+    def check_learning_data(self, run, mtime):
+        run["mtime"] = mtime
+        run["has_learning_data"] = os.path.isfile(os.path.join(self.reports_dir, run["name"], LEARNING_DATA))
+
+    def refresh(self):
+        # Returns True when the index changed
+        if not self.loaded:
+            self.load_index()
+        try:
+            dir_mtime = os.stat(self.reports_dir).st_mtime
+        except OSError:
+            return False
+
+        changed = False
+        if dir_mtime != self.dir_mtime:
+            # Folders were added or removed: one listing, parsing only the folders not seen before
+            runs = {}
+            try:
+                with os.scandir(self.reports_dir) as scanned:
+                    for entry in scanned:
+                        if not entry.is_dir():
+                            continue
+                        mtime = entry.stat().st_mtime
+                        run = self.runs.get(entry.name)
+                        if run is None:
+                            run = parse_run(entry.name)
+                            self.check_learning_data(run, mtime)
+                        elif run["mtime"] != mtime:
+                            self.check_learning_data(run, mtime)
+                        runs[entry.name] = run
+            except OSError:
+                return False
+            self.runs = runs
+            self.dir_mtime = dir_mtime
+            changed = True
+        else:
+            # Same folders; a run still being written may have gained its learning data since
+            active_since = time.time() - ACTIVE_SECONDS
+            for run in self.runs.values():
+                if run["has_learning_data"] or run["mtime"] < active_since:
+                    continue
+                try:
+                    mtime = os.stat(os.path.join(self.reports_dir, run["name"])).st_mtime
+                except OSError:
+                    continue
+                if mtime != run["mtime"]:
+                    self.check_learning_data(run, mtime)
+                    changed = True
+
+        if changed:
+            self.rebuild_queries()
+            self.save_index()
+        return changed
+
+    def rebuild_queries(self):
+        self.by_key = {}
+        for name in sorted(self.runs):
+            run = self.runs[name]
+            self.by_key.setdefault((run["experiment"], tuple(run["sources"])), []).append(run)
+
+    def query(self, experiment, sources):
+        # Runs of an experiment type made with exactly these sources (1-based), in folder name order
+        return self.by_key.get((experiment, tuple(sources)), [])
+
+    def find(self, model_name, experiment, sources):
+        # The run a bound model name (timestamp prefix) refers to
+        return next((run for run in self.query(experiment, sources) if run["name"].startswith(model_name)), None)
+
+    def path(self, run):
+        return os.path.join(self.reports_dir, run["name"])
+
+
+_shared = {}
+
+
+def shared(reports_dir):
+    # One index per reports directory for the whole application
+    if reports_dir not in _shared:
+        _shared[reports_dir] = RunIndex(reports_dir)
+    return _shared[reports_dir]
@@ -0,0 +1,126 @@
+import os
+import time
+import uuid
+
+import local_cache
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+INTERRUPTED = "interrupted"  # Was running when the GUI stopped; never restarted automatically
+QUEUE_FILE = "run_queue.json"
+
+
+def default_path():
+    # In the user cache, so the queue does not depend on where the GUI is started from and the
+    # application directory may be read-only
+    directory = local_cache.cache_dir()
+    return os.path.join(directory, QUEUE_FILE) if directory else None
+
+
+class RunQueue:
+    # Recipes and their run settings, executed in order. Saved after every change so the
+    # queue survives a crash of the GUI.
+    def __init__(self, path=None):
+        self.path = path or default_path()  # None: kept in memory only
+        self.jobs = []
+        self.load()
+
+    def load(self):
+        self.jobs = local_cache.read_json(self.path, {}).get("jobs", []) if self.path else []
+        for job in self.jobs:
+            if job["status"] == RUNNING:
+                job["status"] = INTERRUPTED
+                job["message"] = "GUI stopped during the run"
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            local_cache.atomic_write_json(self.path, {"jobs": self.jobs})
+        except OSError as e:
+            print(f"Could not save run queue: {e}")
+
+    def add(self, recipe_path, settings):
+        job = {"id": uuid.uuid4().hex, "recipe_path": recipe_path, "settings": settings,
+               "status": PENDING, "message": "", "added": time.time(), "started": None, "finished": None}
+        self.jobs.append(job)
+        self.save()
+        return job
+
+    def remove(self, job_id):
+        self.jobs = [job for job in self.jobs if job["id"] != job_id or job["status"] == RUNNING]
+        self.save()
+
+    def retry(self, job_id):
+        for job in self.jobs:
+            if job["id"] == job_id and job["status"] != RUNNING:
+                job.update(status=PENDING, message="", started=None, finished=None)
+        self.save()
+
+    def next_pending(self):
+        return next((job for job in self.jobs if job["status"] == PENDING), None)
+
+    def mark(self, job, status, message=""):
+        job["status"] = status
+        job["message"] = message
+        if status == RUNNING:
+            job["started"] = time.time()
+        else:
+            job["finished"] = time.time()
+        self.save()
+
+    def describe(self, job):
+        settings = job["settings"]
+        return f"[{job['status']}] {os.path.basename(job['recipe_path'])} x{settings['iterations']}" + (f" - {job['message']}" if job["message"] else "")
+
+
+class RunScheduler:
+    # Starts queued jobs back to back on a RecipeRunner. prepare(job) returns (job_function, args)
+    # or raises when the job cannot run (e.g. it fails validation); such jobs are skipped.
+    def __init__(self, run_queue, runner, prepare):
+        self.run_queue = run_queue
+        self.runner = runner
+        self.prepare = prepare
+        self.active = False
+        self.current = None
+
+    def start(self):
+        # Returns the job now running, or None when nothing was left to run
+        self.active = True
+        if self.runner.running:
+            return self.current
+        return self.start_next()
+
+    def stop(self):
+        # The job that is running finishes; nothing further is started
+        self.active = False
+
+    def start_next(self):
+        while self.active:
+            job = self.run_queue.next_pending()
+            if job is None:
+                self.active = False
+                return None
+            try:
+                function, args = self.prepare(job)
+            except Exception as e:
+                self.run_queue.mark(job, FAILED, str(e))
+                continue
+            self.run_queue.mark(job, RUNNING)
+            self.current = job
+            self.runner.start(function, *args)
+            return job
+        return None
+
+    def on_finished(self, kind, message):
+        # Called with the runner's final event ("done", "cancelled" or "error")
+        job, self.current = self.current, None
+        if job is None:
+            return None
+        self.run_queue.mark(job, {"done": DONE, "cancelled": CANCELLED, "error": FAILED}[kind], message)
+        if kind != "done":
+            self.active = False  # Leave the chamber alone after an operator stop or a run error
+        return self.start_next()
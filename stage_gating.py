@@ -0,0 +1,83 @@
+# Which workflow stages are open, declared as a dependency graph. Each stage lists the stages it
+# requires and a condition on workflow_data:
+#   ("always",)              open once the required stages are
+#   ("nonempty", key)        workflow_data[key] is a non-empty list
+#   ("any_prefix", prefix)   at least one key starts with prefix (e.g. a bound model)
+#   ("never",)               stage not available yet
+# Conditions are kept up to date from the keys that changed, so a save costs O(changed keys)
+# and is_open() is a dictionary lookup.
+
+WORKFLOW_STAGE_RULES = {
+    "Define Target Compositions": ((), ("always",)),
+    "Find Boundaries": (("Define Target Compositions",), ("nonempty", "target_compositions")),
+    "Learn Sputter Process": (("Find Boundaries",), ("any_prefix", "EE_LearnMinimumRate_model_")),
+    "Calibrate Compositions": (("Learn Sputter Process",), ("never",)),
+    "Learn Feature Map": (("Calibrate Compositions",), ("never",)),
+    "Feature Identification": (("Learn Feature Map",), ("never",)),
+}
+
+
+class StageGraph:
+    def __init__(self, rules):
+        # rules: {stage: (required stages, condition)}, each stage after the stages it requires
+        self.rules = dict(rules)
+        seen = set()
+        for stage, (requires, condition) in self.rules.items():
+            missing = [required for required in requires if required not in seen]
+            if missing:
+                raise ValueError(f"Stage {stage!r} requires {missing}, which must be declared before it")
+            if condition[0] not in ("always", "nonempty", "any_prefix", "never"):
+                raise ValueError(f"Stage {stage!r} has an unknown condition {condition[0]!r}")
+            seen.add(stage)
+        self.keys = {condition[1] for requires, condition in self.rules.values() if condition[0] == "nonempty"}
+        self.prefixes = tuple({condition[1] for requires, condition in self.rules.values() if condition[0] == "any_prefix"})
+        self.prefix_keys = {prefix: set() for prefix in self.prefixes}  # Keys present per prefix
+        self.nonempty = {key: False for key in self.keys}
+        self.open = {stage: False for stage in self.rules}
+
+    def reset(self, data):
+        # Recompute everything for a new document; returns the stages whose state changed
+        for prefix in self.prefixes:
+            self.prefix_keys[prefix] = {key for key in data if key.startswith(prefix)}
+        for key in self.keys:
+            self.nonempty[key] = bool(data.get(key))
+        return self._propagate()
+
+    def update(self, data, keys):
+        # Account for changes to the given top-level keys; returns the stages whose state changed
+        for key in keys:
+            if key in self.nonempty:
+                self.nonempty[key] = bool(data.get(key))
+            for prefix in self.prefixes:
+                if key.startswith(prefix):
+                    if key in data:
+                        self.prefix_keys[prefix].add(key)
+                    else:
+                        self.prefix_keys[prefix].discard(key)
+        return self._propagate()
+
+    def is_open(self, stage):
+        return self.open.get(stage, False)
+
+    def open_stages(self):
+        return [stage for stage, is_open in self.open.items() if is_open]
+
+    def _condition_met(self, condition):
+        kind = condition[0]
+        if kind == "always":
+            return True
+        if kind == "nonempty":
+            return self.nonempty[condition[1]]
+        if kind == "any_prefix":
+            return bool(self.prefix_keys[condition[1]])
+        return False
+
+    def _propagate(self):
+        # Declaration order is a topological order, so one pass settles every stage
+        changed = []
+        for stage, (requires, condition) in self.rules.items():
+            is_open = all(self.open[required] for required in requires) and self._condition_met(condition)
+            if is_open != self.open[stage]:
+                self.open[stage] = is_open
+                changed.append(stage)
+        return changed
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+import workflow_store
+
+
+def write_workflow(path, data, ops, snapshot_text=None, torn=None):
+    # A workflow file as left behind by a crash: snapshot plus journal, nothing compacted
+    text = json.dumps(data)
+    path.write_text(text)
+    lines = [json.dumps({"snapshot": workflow_store._snapshot_hash(snapshot_text or text)})]
+    lines += [json.dumps(op) for op in ops]
+    journal = "\n".join(lines) + "\n"
+    if torn is not None:
+        journal += torn
+    path.with_name(path.name + ".journal").write_text(journal)
+
+
+def failing_append(path, lines):
+    raise OSError("disk full")
+
+
+def test_journal_replayed_after_crash(tmp_path):
+    path = tmp_path / "workflow.json"
+    write_workflow(path, {"name": "a", "steps": [1]}, [
+        {"op": "append", "key": "steps", "values": [2, 3]},
+        {"op": "set", "key": "name", "value": "b"},
+        {"op": "del", "key": "missing"},
+    ])
+    assert workflow_store.read_workflow(str(path)) == {"name": "b", "steps": [1, 2, 3]}
+
+    store = workflow_store.WorkflowStore(str(path))
+    assert store.data == {"name": "b", "steps": [1, 2, 3]}
+    assert store.journal_length == 3
+    store.close()
+    assert json.loads(path.read_text()) == {"name": "b", "steps": [1, 2, 3]}
+    assert workflow_store.read_workflow(str(path)) == {"name": "b", "steps": [1, 2, 3]}
+
+
+def test_stale_journal_after_compaction_ignored(tmp_path):
+    # The snapshot was rewritten but the crash came before the journal was reset
+    path = tmp_path / "workflow.json"
+    write_workflow(path, {"steps": [1, 2]}, [{"op": "append", "key": "steps", "values": [2]}],
+                   snapshot_text=json.dumps({"steps": [1]}))
+    assert workflow_store.read_workflow(str(path)) == {"steps": [1, 2]}
+
+    store = workflow_store.WorkflowStore(str(path))
+    assert store.data == {"steps": [1, 2]}
+    store.apply([{"op": "append", "key": "steps", "values": [3]}])
+    store.flush()
+    assert workflow_store.read_workflow(str(path)) == {"steps": [1, 2, 3]}
+    store.close()
+
+
+def test_torn_last_line_dropped(tmp_path):
+    path = tmp_path / "workflow.json"
+    write_workflow(path, {"steps": []}, [{"op": "append", "key": "steps", "values": [1]}],
+                   torn='{"op": "append", "key": "st')
+    assert workflow_store.read_workflow(str(path)) == {"steps": [1]}
+
+    store = workflow_store.WorkflowStore(str(path))
+    assert store.journal_length == 1
+    store.close()
+    assert workflow_store.read_workflow(str(path)) == {"steps": [1]}
+
+
+def test_write_failure_raised_then_resynced(tmp_path, monkeypatch):
+    path = tmp_path / "workflow.json"
+    store = workflow_store.WorkflowStore.create(str(path), {"steps": []})
+
+    with monkeypatch.context() as patch:
+        patch.setattr(workflow_store, "_append_lines", failing_append)
+        store.apply([{"op": "append", "key": "steps", "values": [1]}])
+        with pytest.raises(workflow_store.WorkflowWriteError):
+            store.flush()
+
+    # The next change rewrites the whole document, including the one that was lost
+    store.apply([{"op": "append", "key": "steps", "values": [2]}])
+    store.flush()
+    assert workflow_store.read_workflow(str(path)) == {"steps": [1, 2]}
+    store.close()
+
+
+def test_next_apply_raises_unreported_failure(tmp_path, monkeypatch):
+    path = tmp_path / "workflow.json"
+    store = workflow_store.WorkflowStore.create(str(path), {"steps": []})
+    monkeypatch.setattr(workflow_store, "_append_lines", failing_append)
+    store.apply([{"op": "append", "key": "steps", "values": [1]}])
+    store._writes.join()
+    with pytest.raises(workflow_store.WorkflowWriteError):
+        store.apply([{"op": "append", "key": "steps", "values": [2]}])
+    assert store.data == {"steps": [1]}
+    monkeypatch.undo()
+    store.close()
@@ -0,0 +1,106 @@
+import hashlib
+import os
+
+import local_cache
+import workflow_schema
+import workflow_store
+
+INDEX_VERSION = 2
+MODEL_KEY_PREFIXES = ("EE_LearnMinimumRate_model_", "SJ_LearnSputterProcess_model_")
+
+
+def summarise(name, data):
+    target_materials = data.get("target materials", [])
+    active_sources = data.get("active_sources", [])
+    return {
+        "name": name,
+        "target materials": target_materials,
+        "active_sources": active_sources,
+        "active_materials": [m for m, active in zip(target_materials, active_sources) if active],
+        "target_count": len(data.get("target_compositions", [])),
+        "model_keys": sorted(key for key in data if key.startswith(MODEL_KEY_PREFIXES)),
+        "error": None,
+    }
+
+
+class WorkflowCatalogue:
+    # Summary of every workflow file in a folder, persisted between sessions. Only files whose
+    # snapshot or journal changed since the last refresh are read again.
+    def __init__(self, workflow_dir, index_path=None):
+        self.workflow_dir = workflow_dir
+        if index_path is None:
+            directory = local_cache.cache_dir()
+            if directory:
+                digest = hashlib.sha1(os.path.abspath(workflow_dir).encode("utf-8")).hexdigest()[:12]
+                index_path = os.path.join(directory, f"workflow_index_{digest}.json")
+        self.index_path = index_path
+        self.entries = {}
+        if index_path:
+            data = local_cache.read_json(index_path, {})
+            if data.get("version") == INDEX_VERSION:
+                self.entries = {entry["name"]: entry for entry in data.get("entries", [])}
+
+    def save_index(self):
+        if not self.index_path:
+            return
+        try:
+            local_cache.atomic_write_json(self.index_path, {"version": INDEX_VERSION, "entries": list(self.entries.values())})
+        except OSError as e:
+            print(f"Could not save workflow index: {e}")
+
+    def refresh(self):
+        try:
+            with os.scandir(self.workflow_dir) as scanned:
+                stats = {entry.name: entry.stat() for entry in scanned if entry.is_file()}
+        except OSError:
+            return False
+
+        changed = False
+        entries = {}
+        for name, stat in stats.items():
+            if not name.endswith(".json"):
+                continue
+            journal = stats.get(os.path.basename(workflow_store.journal_path(name)))
+            version = [stat.st_mtime, stat.st_size, journal.st_mtime if journal else None, journal.st_size if journal else None]
+            known = self.entries.get(name)
+            if known and known.get("version") == version:
+                entries[name] = known
+                continue
+            try:
+                data = workflow_store.read_workflow(os.path.join(self.workflow_dir, name))
+            except (OSError, ValueError) as e:
+                entry = summarise(name, {})
+                entry["error"] = f"Unreadable: {e}"
+            else:
+                errors = workflow_schema.validate_workflow(data)
+                entry = summarise(name, data if not errors else {})
+                entry["error"] = f"Invalid: {errors[0]}" if errors else None
+            entry["version"] = version
+            entry["mtime"] = stat.st_mtime
+            entries[name] = entry
+            changed = True
+
+        if changed or entries.keys() != self.entries.keys():
+            self.entries = entries
+            self.save_index()
+            return True
+        return False
+
+    @staticmethod
+    def is_compatible(entry, materials):
+        # A workflow can run when it was defined for the current source configuration
+        return entry["error"] is None and list(entry["target materials"]) == list(materials)
+
+    def search(self, text="", materials=None, compatible_only=False):
+        # Entries whose file name, active materials or bound models contain text (case-insensitive)
+        text = text.lower()
+        results = []
+        for name in sorted(self.entries):
+            entry = self.entries[name]
+            if compatible_only and not self.is_compatible(entry, materials):
+                continue
+            haystack = " ".join([name] + entry["active_materials"] + entry["model_keys"]).lower()
+            if text and text not in haystack:
+                continue
+            results.append(entry)
+        return results
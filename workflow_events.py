@@ -0,0 +1,45 @@
+class WorkflowEvents:
+    # Change notifications for workflow_data. Subscribers name the keys and key prefixes they
+    # depend on; changes are collected until the Tk loop is idle and every affected subscriber is
+    # then called once with the set of keys that changed. A key set of None means the whole
+    # document was replaced (another workflow was loaded or created).
+    def __init__(self, schedule):
+        self.schedule = schedule  # e.g. widget.after_idle
+        self.subscribers = []
+        self.changed_keys = set()
+        self.replaced = False
+        self.pending = False
+
+    def subscribe(self, callback, keys=(), prefixes=()):
+        subscriber = (callback, frozenset(keys), tuple(prefixes))
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+
+    def changed(self, keys):
+        self.changed_keys.update(keys)
+        self.request_flush()
+
+    def replaced_all(self):
+        self.replaced = True
+        self.request_flush()
+
+    def request_flush(self):
+        if not self.pending:
+            self.pending = True
+            self.schedule(self.flush)
+
+    def flush(self):
+        self.pending = False
+        keys, replaced = self.changed_keys, self.replaced
+        self.changed_keys, self.replaced = set(), False
+        for callback, subscribed, prefixes in list(self.subscribers):
+            if replaced:
+                callback(None)
+                continue
+            relevant = {key for key in keys if key in subscribed or key.startswith(prefixes)}
+            if relevant:
+                callback(relevant)
@@ -0,0 +1,185 @@
+import collections
+import json
+
+import workflow_store
+
+# Undo/redo over a WorkflowStore. Each step keeps only the ops it applied and their inverses
+# (an append is undone by truncating the list back), so undo and redo cost O(change) and a step
+# never copies the rest of the document. The history is kept in "<file>.history" next to the
+# workflow: a JSON-lines journal of pushed steps, undos and redos, whose first line may be a
+# snapshot of both stacks. Every change appends one line; the journal is folded into a new
+# snapshot after HISTORY_COMPACT_AFTER lines. The history is dropped on load if the workflow no
+# longer ends in the state it recorded.
+
+HISTORY_LIMIT = 100  # Undo steps kept
+HISTORY_MAX_BYTES = 1024 * 1024  # Serialized size of all steps kept
+HISTORY_COMPACT_AFTER = 200  # Journal lines before the history file is rewritten
+
+
+def history_path(path):
+    return path + ".history"
+
+
+def inverse_ops(data, ops):
+    # Ops restoring data after ops have been applied to it; computed before they are applied
+    inverse = []
+    for op in ops:
+        key = op["key"]
+        if op["op"] == "append" and key in data:
+            inverse.append({"op": "truncate", "key": key, "length": len(data[key])})
+        elif key in data:
+            inverse.append({"op": "set", "key": key, "value": data[key]})
+        else:
+            inverse.append({"op": "del", "key": key})
+    return json.loads(json.dumps(inverse[::-1]))  # Own copies of the replaced values
+
+
+def holds(data, ops):
+    # True when data is in the state ops leave it in
+    for op in ops:
+        key = op["key"]
+        if op["op"] == "set" and data.get(key) != op["value"]:
+            return False
+        if op["op"] == "del" and key in data:
+            return False
+        if op["op"] == "append" and data.get(key, [])[len(data.get(key, [])) - len(op["values"]):] != op["values"]:
+            return False
+        if op["op"] == "truncate" and len(data.get(key, [])) != op["length"]:
+            return False
+    return True
+
+
+def read_journal(path):
+    # The parsed lines of a history file; a torn last line from a crash is dropped
+    try:
+        with open(path, 'r') as file:
+            lines = file.read().splitlines()
+    except OSError:
+        return []
+    entries = []
+    for line in lines:
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            break
+    return entries
+
+
+class WorkflowHistory:
+    def __init__(self, store, limit=HISTORY_LIMIT, max_bytes=HISTORY_MAX_BYTES, compact_after=HISTORY_COMPACT_AFTER):
+        self.store = store
+        self.path = history_path(store.path)
+        self.max_bytes = max_bytes
+        self.compact_after = compact_after
+        self.undo_steps = collections.deque(maxlen=limit)
+        self.redo_steps = []
+        self.size = 0
+        entries = read_journal(self.path)
+        for entry in entries:
+            self.replay(entry)
+        self.journal_length = len(entries)
+        # A history from before the workflow was edited elsewhere cannot be applied safely
+        if self.undo_steps and not holds(store.data, self.undo_steps[-1]["ops"]):
+            self.clear()
+        elif not self.undo_steps and self.redo_steps and not holds(store.data, self.redo_steps[-1]["inverse"]):
+            self.clear()
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_steps)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_steps)
+
+    def replay(self, entry):
+        event = entry.get("event")
+        if event is None:
+            # Snapshot of both stacks (also the format of history files written before the journal)
+            self.undo_steps.clear()
+            self.redo_steps = []
+            self.size = 0
+            for step in entry.get("undo", []):
+                self.push(step)
+            self.redo_steps = list(entry.get("redo", []))
+            self.size += sum(step["size"] for step in self.redo_steps)
+        elif event == "push":
+            self.drop_redo()
+            self.push(entry["step"])
+        elif event == "undo" and self.undo_steps:
+            self.redo_steps.append(self.undo_steps.pop())
+        elif event == "redo" and self.redo_steps:
+            self.undo_steps.append(self.redo_steps.pop())
+
+    def commit(self, new_data, label):
+        # Save new_data through the store and record the change as one undo step
+        ops = workflow_store.diff(self.store.data, new_data)
+        if not ops:
+            return ops
+        inverse = inverse_ops(self.store.data, ops)
+        ops = self.store.apply(ops)
+        step = {"label": label, "ops": json.loads(json.dumps(ops)), "inverse": inverse}
+        step["size"] = len(json.dumps(step))
+        self.drop_redo()
+        self.push(step)
+        self.record({"event": "push", "step": step})
+        return ops
+
+    def drop_redo(self):
+        self.size -= sum(redo["size"] for redo in self.redo_steps)
+        self.redo_steps = []
+
+    def push(self, step):
+        if len(self.undo_steps) == self.undo_steps.maxlen:
+            self.size -= self.undo_steps[0]["size"]
+        self.undo_steps.append(step)
+        self.size += step["size"]
+        while self.size > self.max_bytes and len(self.undo_steps) > 1:
+            self.size -= self.undo_steps.popleft()["size"]
+
+    def undo(self):
+        # Returns (label, ops applied) or None when there is nothing to undo
+        if not self.undo_steps:
+            return None
+        ops = self.store.apply(self.undo_steps[-1]["inverse"])  # Raises before anything moves if a write failed
+        step = self.undo_steps.pop()
+        self.redo_steps.append(step)
+        self.record({"event": "undo"})
+        return step["label"], ops
+
+    def redo(self):
+        if not self.redo_steps:
+            return None
+        ops = self.store.apply(self.redo_steps[-1]["ops"])
+        step = self.redo_steps.pop()
+        self.undo_steps.append(step)
+        self.record({"event": "redo"})
+        return step["label"], ops
+
+    def next_undo_label(self):
+        return self.undo_steps[-1]["label"] if self.undo_steps else None
+
+    def next_redo_label(self):
+        return self.redo_steps[-1]["label"] if self.redo_steps else None
+
+    def record(self, entry):
+        # Journal one change; the journal is folded into a snapshot once it gets long
+        self.store.append_file(self.path, [json.dumps(entry)])
+        self.journal_length += 1
+        if self.journal_length >= self.compact_after:
+            self.compact()
+
+    def compact(self):
+        self.store.write_file(self.path, json.dumps({"undo": list(self.undo_steps), "redo": self.redo_steps}) + "\n")
+        self.journal_length = 1
+
+    def close(self):
+        # Fold the journal in before the store is closed
+        if self.journal_length > 1:
+            self.compact()
+
+    def clear(self):
+        self.undo_steps.clear()
+        self.redo_steps = []
+        self.size = 0
+        self.compact()
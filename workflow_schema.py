@@ -0,0 +1,139 @@
+import os
+import re
+import sys
+
+import workflow_store
+
+# The schema is written as nested validator specs and compiled once into plain functions; a
+# compiled validator checks a whole document in one pass and returns every error with the path
+# to the offending value, e.g. "target_compositions[2].Sn: expected a non-negative number, got 'x'".
+
+MODEL_KEY = re.compile(r"^(EE_LearnMinimumRate|SJ_LearnSputterProcess)_model_(.+)$")
+
+
+def _path(parent, key):
+    if isinstance(key, int):
+        return f"{parent}[{key}]"
+    return f"{parent}.{key}" if parent else str(key)
+
+
+def _type_name(value):
+    return {dict: "object", list: "list", str: "string", bool: "boolean", int: "number", float: "number"}.get(type(value), type(value).__name__)
+
+
+def compile_spec(spec):
+    # spec is a tuple: ("str",), ("bool",), ("amount",), ("list", item_spec) or
+    # ("object", required, optional, patterns) where required/optional map key -> spec and
+    # patterns is a list of (compiled regex, spec); keys matching nothing are errors.
+    kind = spec[0]
+    if kind == "str":
+        def check(value, path, errors):
+            if not isinstance(value, str):
+                errors.append(f"{path}: expected a string, got {_type_name(value)}")
+    elif kind == "bool":
+        def check(value, path, errors):
+            if not isinstance(value, bool):
+                errors.append(f"{path}: expected true or false, got {value!r}")
+    elif kind == "amount":
+        # Whole or decimal amount; older files store them as strings
+        def check(value, path, errors):
+            if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                errors.append(f"{path}: expected a non-negative number, got {_type_name(value)}")
+                return
+            try:
+                number = float(value)
+            except ValueError:
+                number = -1.0
+            if not number >= 0:
+                errors.append(f"{path}: expected a non-negative number, got {value!r}")
+    elif kind == "list":
+        check_item = compile_spec(spec[1])
+
+        def check(value, path, errors):
+            if not isinstance(value, list):
+                errors.append(f"{path}: expected a list, got {_type_name(value)}")
+                return
+            for index, item in enumerate(value):
+                check_item(item, _path(path, index), errors)
+    elif kind == "object":
+        required = {key: compile_spec(item) for key, item in spec[1].items()}
+        optional = {key: compile_spec(item) for key, item in spec[2].items()}
+        patterns = [(pattern, compile_spec(item)) for pattern, item in spec[3]]
+
+        def check(value, path, errors):
+            if not isinstance(value, dict):
+                errors.append(f"{path or 'document'}: expected an object, got {_type_name(value)}")
+                return
+            for key in required:
+                if key not in value:
+                    errors.append(f"{path or 'document'}: missing required key {key!r}")
+            for key, item in value.items():
+                check_item = required.get(key) or optional.get(key)
+                if check_item is None:
+                    check_item = next((check for pattern, check in patterns if pattern.match(key)), None)
+                if check_item is None:
+                    errors.append(f"{_path(path, key)}: unexpected key")
+                else:
+                    check_item(item, _path(path, key), errors)
+    else:
+        raise ValueError(f"Unknown schema kind {kind!r}")
+    return check
+
+
+WORKFLOW_SPEC = ("object",
+                 {"target materials": ("list", ("str",)),
+                  "active_sources": ("list", ("bool",))},
+                 {"target_compositions": ("list", ("object", {}, {}, [(re.compile(r".+"), ("amount",))]))},
+                 [(MODEL_KEY, ("str",))])
+
+_check_workflow = compile_spec(WORKFLOW_SPEC)
+
+
+def validate_workflow(data):
+    # Every problem with a workflow document, as "path: message" strings; empty when valid
+    errors = []
+    _check_workflow(data, "", errors)
+    if errors:
+        return errors
+
+    # Checks across keys, once the types are known to be right
+    materials = data["target materials"]
+    active_sources = data["active_sources"]
+    if len(active_sources) != len(materials):
+        errors.append(f"active_sources: has {len(active_sources)} entries for {len(materials)} target materials")
+    active_materials = {material for material, active in zip(materials, active_sources) if active}
+    for index, composition in enumerate(data.get("target_compositions", [])):
+        for material in composition:
+            if material not in active_materials:
+                errors.append(f"target_compositions[{index}].{material}: not an active material of this workflow")
+    for key in data:
+        match = MODEL_KEY.match(key)
+        if match and match.group(2) not in active_materials:
+            errors.append(f"{key}: model bound to {match.group(2)!r}, which is not an active material")
+    return errors
+
+
+def validate_directory(directory):
+    # {file name: errors} for every workflow file in directory (journals replayed)
+    results = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            data = workflow_store.read_workflow(os.path.join(directory, name))
+        except (OSError, ValueError) as e:
+            results[name] = [f"unreadable: {e}"]
+            continue
+        results[name] = validate_workflow(data)
+    return results
+
+
+if __name__ == "__main__":
+    # python workflow_schema.py [directory]  -  exit status 1 if any workflow file is invalid
+    directory = sys.argv[1] if len(sys.argv) > 1 else "workflow definition files"
+    results = validate_directory(directory)
+    for name, errors in results.items():
+        print(f"{name}: {'OK' if not errors else f'{len(errors)} error(s)'}")
+        for error in errors:
+            print(f"    {error}")
+    sys.exit(1 if any(results.values()) else 0)
@@ -0,0 +1,241 @@
+import copy
+import hashlib
+import json
+import os
+import queue
+import tempfile
+import threading
+
+# A workflow definition file is a JSON snapshot plus "<file>.journal", a JSON-lines log of the
+# top-level changes made since the snapshot was written. The journal's first line records the
+# hash of the snapshot it applies to, so a journal left behind by an interrupted compaction is
+# recognised as already folded in and ignored.
+
+COMPACT_AFTER = 200  # Journal entries before the snapshot is rewritten
+
+
+class WorkflowWriteError(OSError):
+    # A background write of the workflow (or a file written with it) failed
+    pass
+
+
+def journal_path(path):
+    return path + ".journal"
+
+
+def _snapshot_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def apply_op(data, op):
+    if op["op"] == "set":
+        data[op["key"]] = op["value"]
+    elif op["op"] == "append":
+        data.setdefault(op["key"], []).extend(op["values"])
+    elif op["op"] == "del":
+        data.pop(op["key"], None)
+    elif op["op"] == "truncate":
+        del data[op["key"]][op["length"]:]
+
+
+def _read(path):
+    with open(path, 'r') as file:
+        text = file.read()
+    data = json.loads(text)
+    ops = []
+    try:
+        with open(journal_path(path), 'r') as file:
+            lines = file.read().splitlines()
+    except OSError:
+        lines = None
+    journal_valid = False
+    if lines:
+        try:
+            journal_valid = json.loads(lines[0]).get("snapshot") == _snapshot_hash(text)
+        except ValueError:
+            pass
+    if journal_valid:
+        for line in lines[1:]:
+            try:
+                ops.append(json.loads(line))
+            except ValueError:
+                break  # Torn last line from a crash during an append
+    for op in ops:
+        apply_op(data, op)
+    stale_journal = lines is not None and not journal_valid
+    return data, text, len(ops), stale_journal
+
+
+def read_workflow(path):
+    # The current workflow document: snapshot with the journal replayed on top
+    return _read(path)[0]
+
+
+def diff(old, new):
+    # Top-level changes turning old into new; growing lists become appends of the new items
+    ops = []
+    for key, value in new.items():
+        if key not in old:
+            ops.append({"op": "set", "key": key, "value": value})
+            continue
+        current = old[key]
+        if current == value:
+            continue
+        if isinstance(current, list) and isinstance(value, list) and len(value) > len(current) and value[:len(current)] == current:
+            ops.append({"op": "append", "key": key, "values": value[len(current):]})
+        else:
+            ops.append({"op": "set", "key": key, "value": value})
+    for key in old:
+        if key not in new:
+            ops.append({"op": "del", "key": key})
+    return ops
+
+
+class WorkflowStore:
+    # Keeps the parsed workflow in memory; commit() journals only what changed. All file writes
+    # happen in order on a background thread so saving never blocks the Tk loop.
+    def __init__(self, path, compact_after=COMPACT_AFTER):
+        self.path = path
+        self.compact_after = compact_after
+        self.data, snapshot_text, self.journal_length, stale_journal = _read(path)
+        self.snapshot = _snapshot_hash(snapshot_text)
+        self.error = None  # First write failure not yet reported through check()
+        self.resync = False  # After a failure the next change rewrites the whole snapshot
+        self._writes = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="workflow-store", daemon=True)
+        self._writer.start()
+        if stale_journal:
+            # Journal from an older snapshot (already compacted, or the file was edited by hand)
+            self._writes.put(("reset", self.snapshot, None))
+
+    @classmethod
+    def create(cls, path, data, compact_after=COMPACT_AFTER):
+        _write_atomic(path, json.dumps(data))
+        try:
+            os.remove(journal_path(path))
+        except FileNotFoundError:
+            pass
+        return cls(path, compact_after)
+
+    def commit(self, new_data):
+        # Journal the difference between new_data and the stored document; returns the ops
+        return self.apply(diff(self.data, new_data))
+
+    def apply(self, ops):
+        # Apply ops to the stored document and journal them; returns the ops as applied. Raises
+        # WorkflowWriteError, without applying anything, if an earlier write failed.
+        self.check()
+        if not ops:
+            return ops
+        ops = json.loads(json.dumps(ops))  # Detach from the caller's objects
+        for op in ops:
+            apply_op(self.data, op)
+        self._writes.put(("append", self.snapshot, [json.dumps(op) for op in ops]))
+        self.journal_length += len(ops)
+        if self.journal_length >= self.compact_after or self.resync:
+            self.compact()
+        return ops
+
+    def compact(self):
+        # Fold the journal into a fresh snapshot (written to a temporary file, then renamed)
+        if self.journal_length == 0 and not self.resync:
+            return
+        self.resync = False
+        text = json.dumps(self.data)
+        self.snapshot = _snapshot_hash(text)
+        self.journal_length = 0
+        self._writes.put(("snapshot", self.snapshot, text))
+
+    def write_file(self, path, text):
+        # Write a file next to the workflow (e.g. its history) in order with the journal writes
+        self._writes.put(("file", path, text))
+
+    def append_file(self, path, lines):
+        # Append lines to a file next to the workflow, in order with the other writes
+        self._writes.put(("append_file", path, lines))
+
+    @property
+    def idle(self):
+        # True once every queued write has been attempted
+        return self._writes.unfinished_tasks == 0
+
+    def check(self):
+        # Raise the first write failure since the last check. The file is then behind the
+        # document in memory, so the next change rewrites the whole snapshot.
+        error, self.error = self.error, None
+        if error is not None:
+            self.resync = True
+            raise WorkflowWriteError(f"Could not write workflow file {self.path}: {error}") from error
+
+    def flush(self):
+        # Wait for the queued writes; raises WorkflowWriteError if one failed
+        self._writes.join()
+        self.check()
+
+    def close(self):
+        # Write everything out and stop the writer thread; the store is not used afterwards.
+        # Raises WorkflowWriteError if a write failed.
+        if not self._writer.is_alive():
+            return
+        self.compact()
+        self._writes.put(None)
+        self._writer.join()
+        self.check()
+
+    def copy(self):
+        return copy.deepcopy(self.data)
+
+    def _write_loop(self):
+        while True:
+            # (kind, snapshot hash, payload); for "file" and "append_file" writes the second item is
+            # the path instead.
+            # None, queued by close(), stops the thread once the writes before it are done.
+            item = self._writes.get()
+            if item is None:
+                self._writes.task_done()
+                return
+            kind, snapshot, payload = item
+            try:
+                if kind == "append":
+                    self._append(snapshot, payload)
+                elif kind == "file":
+                    _write_atomic(snapshot, payload)
+                elif kind == "append_file":
+                    _append_lines(snapshot, payload)
+                else:
+                    if kind == "snapshot":
+                        _write_atomic(self.path, payload)
+                    _write_atomic(journal_path(self.path), json.dumps({"snapshot": snapshot}) + "\n")
+            except OSError as e:
+                if self.error is None:
+                    self.error = e  # Raised on the Tk thread by check()
+            finally:
+                self._writes.task_done()
+
+    def _append(self, snapshot, lines):
+        path = journal_path(self.path)
+        if not os.path.exists(path):
+            _write_atomic(path, json.dumps({"snapshot": snapshot}) + "\n")
+        _append_lines(path, lines)
+
+
+def _append_lines(path, lines):
+    with open(path, 'a') as file:
+        file.write("\n".join(lines) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise